@@ -0,0 +1,71 @@
+"""Time winner draws against a large giveaway, in memory and in the SQLite store.
+
+Run from the repository root:
+    python benchmarks/draw_benchmark.py [entrants] [winners]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import ParticipantSet, SQLiteGiveawayStore, WinnerDraw
+
+def bench_sqlite(path, entrants, winners, weighted):
+    store = SQLiteGiveawayStore(path)
+    giveaway_id = "2" if weighted else "1"
+    started = time.perf_counter()
+    reach = 0
+    rows = []
+    for user_id in range(10**17, 10**17 + entrants):
+        weight = random.randint(1, 3) if weighted else 1
+        reach += weight
+        rows.append((int(giveaway_id), user_id, weight, reach))
+    with store.db:
+        store.db.executemany("INSERT INTO participants (giveaway_id, user_id, weight, reach) VALUES (?, ?, ?, ?)", rows)
+    kind = "weighted" if weighted else "unweighted"
+    print(f"Stored {entrants:,} {kind} entrants in SQLite in {time.perf_counter() - started:.2f}s")
+    
+    started = time.perf_counter()
+    drawn = store.draw(giveaway_id, winners)
+    elapsed = time.perf_counter() - started
+    print(f"Drew {len(drawn)} {kind} winners from SQLite in {elapsed * 1000:.3f}ms")
+    assert len(set(drawn)) == len(drawn)
+    
+    store.add_winners(giveaway_id, drawn)
+    started = time.perf_counter()
+    rerolled = store.draw(giveaway_id, 1)
+    elapsed = time.perf_counter() - started
+    print(f"Rerolled 1 {kind} winner from SQLite in {elapsed * 1000:.3f}ms")
+    assert rerolled[0] not in drawn
+
+def main():
+    entrants = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    winners = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    
+    started = time.perf_counter()
+    participants = ParticipantSet(range(10**17, 10**17 + entrants))
+    print(f"Built {entrants:,} entrants in {time.perf_counter() - started:.2f}s")
+    
+    started = time.perf_counter()
+    drawn = WinnerDraw(participants).draw(winners)
+    elapsed = time.perf_counter() - started
+    print(f"Drew {len(drawn)} winners in {elapsed * 1000:.3f}ms")
+    assert len(set(drawn)) == len(drawn)
+    
+    started = time.perf_counter()
+    draw = WinnerDraw(participants, drawn)
+    rerolled = draw.draw(1)
+    elapsed = time.perf_counter() - started
+    print(f"Rerolled 1 winner (rebuilding {len(drawn)} past winners) in {elapsed * 1000:.3f}ms")
+    assert rerolled[0] not in drawn
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "giveaways.db")
+        bench_sqlite(path, entrants, winners, weighted=False)
+        bench_sqlite(path, entrants, winners, weighted=True)
+
+if __name__ == "__main__":
+    main()
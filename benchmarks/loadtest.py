@@ -0,0 +1,351 @@
+"""Drive the bot's real handlers against an in-process stand-in for Discord.
+
+Interactions, channels and messages are local fakes whose API calls sleep for
+a simulated REST latency, so storage and scheduling changes can be compared
+on any Linux box without a live gateway. The bot runs in a scratch directory
+with the repository's plans.json.
+
+Run from the repository root:
+    python benchmarks/loadtest.py [--entries 20000 --duration 60 --tickets 500 ...]
+"""
+import argparse
+import asyncio
+import datetime
+import itertools
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+snowflakes = itertools.count(10**17)
+
+class FakeREST:
+    """Counts simulated API calls and holds each one for the configured latency"""
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+    
+    async def call(self):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+
+class FakeMessage:
+    def __init__(self, rest, channel, message_id=None, **fields):
+        self.rest = rest
+        self.channel = channel
+        self.id = message_id or next(snowflakes)
+        self.embeds = [fields["embed"]] if fields.get("embed") else []
+    
+    async def edit(self, **fields):
+        await self.rest.call()
+        self.channel.edits += 1
+        return self
+
+class FakeChannel:
+    def __init__(self, rest, guild, channel_id=None, name="channel"):
+        self.rest = rest
+        self.guild = guild
+        self.id = channel_id or next(snowflakes)
+        self.name = name
+        self.last_message_id = None
+        self.mention = f"<#{self.id}>"
+        self.sends = 0
+        self.edits = 0  # Message edits, not edits of the channel itself
+    
+    async def send(self, **fields):
+        await self.rest.call()
+        self.sends += 1
+        message = FakeMessage(self.rest, self, **fields)
+        self.last_message_id = message.id
+        return message
+    
+    def get_partial_message(self, message_id):
+        return FakeMessage(self.rest, self, message_id)
+    
+    async def create_text_channel(self, name, **fields):
+        await self.rest.call()
+        return self.guild.add_channel(name)
+    
+    async def create_thread(self, name, **fields):
+        await self.rest.call()
+        return self.guild.add_channel(name)
+    
+    async def add_user(self, user):
+        await self.rest.call()
+    
+    async def edit(self, **fields):
+        await self.rest.call()
+    
+    async def delete(self, **fields):
+        await self.rest.call()
+
+class FakeGuild:
+    def __init__(self, rest):
+        self.rest = rest
+        self.id = next(snowflakes)
+        self.default_role = "@everyone"
+        self.filesize_limit = 25 * 1024 * 1024
+        self.channels = {}
+    
+    def add_channel(self, name, channel_id=None):
+        channel = FakeChannel(self.rest, self, channel_id, name)
+        self.channels[channel.id] = channel
+        return channel
+
+class FakePermissions:
+    administrator = True
+    manage_messages = True
+    manage_channels = True
+
+class FakeMember:
+    def __init__(self, user_id):
+        self.id = user_id
+        self.name = f"user{user_id}"
+        self.premium_since = None
+        self.roles = []
+        self.guild_permissions = FakePermissions()
+        self.mention = f"<@{user_id}>"
+    
+    def __hash__(self):
+        return hash(self.id)
+    
+    def __str__(self):
+        return self.name
+
+class FakeResponse:
+    def __init__(self, interaction):
+        self.interaction = interaction
+        self.acked_at = None
+    
+    def is_done(self):
+        return self.acked_at is not None
+    
+    async def _ack(self):
+        await self.interaction.rest.call()
+        self.acked_at = time.perf_counter()
+    
+    async def send_message(self, *args, **fields):
+        await self._ack()
+    
+    async def defer(self, **fields):
+        await self._ack()
+    
+    async def send_modal(self, modal):
+        await self._ack()
+
+class FakeFollowup:
+    def __init__(self, interaction):
+        self.interaction = interaction
+        self.sent_at = None
+    
+    async def send(self, *args, **fields):
+        await self.interaction.rest.call()
+        self.sent_at = time.perf_counter()
+
+class FakeInteraction:
+    def __init__(self, rest, guild, channel, user_id, custom_id=None):
+        self.rest = rest
+        self.id = next(snowflakes)
+        self.created = time.perf_counter()
+        self.created_at = datetime.datetime.now(datetime.timezone.utc)
+        self.guild = guild
+        self.channel = channel
+        self.user = FakeMember(user_id)
+        self.message = None
+        self.data = {"custom_id": custom_id}
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+
+class FakeContext:
+    def __init__(self, rest, guild, channel):
+        self.rest = rest
+        self.guild = guild
+        self.channel = channel
+        self.author = FakeMember(1)
+    
+    async def send(self, *args, **fields):
+        await self.rest.call()
+
+class LagProbe:
+    """Samples how late a short sleep wakes up while a scenario runs"""
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.samples = []
+        self._task = None
+    
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(time.perf_counter() - started - self.interval)
+    
+    def __enter__(self):
+        self.samples = []
+        self._task = asyncio.create_task(self._run())
+        return self
+    
+    def __exit__(self, *exc):
+        self._task.cancel()
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+def report(name, count, elapsed, latencies, probe):
+    print(
+        f"{name:<16} {count:>7} in {elapsed:7.2f}s  {count / elapsed if elapsed else 0:9.1f}/s  "
+        f"p50 {percentile(latencies, 0.5) * 1000:8.2f}ms  p99 {percentile(latencies, 0.99) * 1000:8.2f}ms  "
+        f"lag p99 {percentile(probe.samples, 0.99) * 1000:7.2f}ms max {max(probe.samples, default=0) * 1000:7.2f}ms"
+    )
+
+async def paced(count, duration, make_task):
+    """Start `count` tasks spread evenly over `duration` seconds and wait for all of them"""
+    tasks = []
+    started = time.perf_counter()
+    for i in range(count):
+        delay = started + duration * i / count - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(make_task(i)))
+    await asyncio.gather(*tasks)
+    return time.perf_counter() - started
+
+async def bench_entries(main, rest, guild, channel, args):
+    giveaway_id = next(snowflakes)
+    main.giveaway_system.create_giveaway(giveaway_id, channel.id, "Load test", 1, 3600, 1, {}, {"title": "Load test"})
+    interactions = []
+    
+    async def enter(i):
+        interaction = FakeInteraction(rest, guild, channel, 10**6 + i, f"giveaway:enter:{giveaway_id}")
+        interactions.append(interaction)
+        await main.GiveawayEntryButton(giveaway_id).callback(interaction)
+    
+    with LagProbe() as probe:
+        elapsed = await paced(args.entries, args.duration, enter)
+    latencies = [interaction.response.acked_at - interaction.created for interaction in interactions]
+    report("giveaway entries", args.entries, elapsed, latencies, probe)
+    assert main.giveaway_system.participant_count(giveaway_id) == args.entries
+    return giveaway_id
+
+async def bench_tickets(main, rest, guild, channel, args):
+    interactions = []
+    ticket_types = ["buy", "free", "partnership", "support", "giveaways"]
+    
+    async def open_one(i):
+        interaction = FakeInteraction(rest, guild, channel, 10**7 + i, "ticket:open")
+        interactions.append(interaction)
+        await interaction.response.defer()
+        await main.open_ticket(interaction, ticket_types[i % len(ticket_types)])
+    
+    with LagProbe() as probe:
+        started = time.perf_counter()
+        await paced(args.tickets, args.ticket_duration, open_one)
+        await main.ticket_pipeline.queue.join()
+        elapsed = time.perf_counter() - started
+    latencies = [interaction.followup.sent_at - interaction.created for interaction in interactions if interaction.followup.sent_at]
+    report("ticket opens", args.tickets, elapsed, latencies, probe)
+
+async def bench_plans(main, rest, guild, channel, args):
+    interactions = []
+    categories = list(main.PLAN_LAYOUTS)
+    
+    async def post(i):
+        interaction = FakeInteraction(rest, guild, channel, 10**8 + i, "purchase:plans")
+        interactions.append(interaction)
+        await interaction.response.defer()
+        await main.send_plan_details(interaction, categories[i % len(categories)])
+    
+    with LagProbe() as probe:
+        elapsed = await paced(args.plans, 1.0, post)
+    latencies = [interaction.followup.sent_at - interaction.created for interaction in interactions]
+    report("plan posts", args.plans, elapsed, latencies, probe)
+
+async def bench_gend(main, rest, guild, channel, giveaway_id):
+    ctx = FakeContext(rest, guild, channel)
+    with LagProbe() as probe:
+        started = time.perf_counter()
+        await main.gend.callback(ctx, str(giveaway_id))
+        elapsed = time.perf_counter() - started
+    report("gend", 1, elapsed, [elapsed], probe)
+    assert main.giveaway_system.get(giveaway_id)["ended"]
+
+async def bench_check_giveaways(main, rest, guild, channel, args):
+    giveaway_ids = []
+    for i in range(args.giveaways):
+        giveaway_id = next(snowflakes)
+        main.giveaway_system.create_giveaway(giveaway_id, channel.id, f"Prize {i}", 3, 1, 1, {}, {"title": f"Prize {i}"})
+        for user_id in range(args.giveaway_entrants):
+            main.giveaway_system.add_participant(giveaway_id, user_id)
+        giveaway_ids.append(giveaway_id)
+    
+    sends, edits = channel.sends, channel.edits
+    with LagProbe() as probe:
+        started = time.perf_counter()
+        main.check_giveaways.start()
+        # Claiming sets "ended" before any API call, so wait for each ending's
+        # winners edit and announcement to go out instead
+        while channel.edits - edits < args.giveaways or channel.sends - sends < args.giveaways:
+            await asyncio.sleep(0.05)
+        assert all(main.giveaway_system.get(giveaway_id)["ended"] for giveaway_id in giveaway_ids)
+        elapsed = time.perf_counter() - started
+        main.check_giveaways.cancel()
+    report("check_giveaways", args.giveaways, elapsed, [elapsed], probe)
+
+async def run(args):
+    import main
+    main.giveaway_system = main.GiveawaySystem(main.open_giveaway_stores(args.storage))
+    
+    rest = FakeREST(args.rest_latency)
+    guild = FakeGuild(rest)
+    for channel_id in main.CHANNELS.values():
+        guild.add_channel("configured", channel_id)
+    channel = guild.add_channel("giveaways")
+    main.bot.get_channel = guild.channels.get
+    main.bot.get_partial_messageable = guild.channels.get
+    
+    main.giveaway_system.start()
+    main.ticket_pipeline.start()
+    main.ticket_backend.start()
+    
+    giveaway_id = await bench_entries(main, rest, guild, channel, args)
+    await bench_tickets(main, rest, guild, channel, args)
+    await bench_plans(main, rest, guild, channel, args)
+    await bench_gend(main, rest, guild, channel, giveaway_id)
+    await bench_check_giveaways(main, rest, guild, channel, args)
+    await main.giveaway_system.save_giveaways(force=True)
+    
+    print(f"\n{rest.calls:,} simulated API calls, {main.outbound.rate_limited} requeued 429s")
+    print(f"Peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MiB")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=20_000, help="giveaway button clicks to replay")
+    parser.add_argument("--duration", type=float, default=60, help="seconds to spread the entries over")
+    parser.add_argument("--tickets", type=int, default=500, help="ticket opens to replay")
+    parser.add_argument("--ticket-duration", type=float, default=10, help="seconds to spread the ticket opens over")
+    parser.add_argument("--plans", type=int, default=60, help="plan posts to replay")
+    parser.add_argument("--giveaways", type=int, default=200, help="giveaways ending at once for check_giveaways")
+    parser.add_argument("--giveaway-entrants", type=int, default=1000, help="entrants in each of those giveaways")
+    parser.add_argument("--rest-latency", type=float, default=0.05, help="simulated seconds per API call")
+    parser.add_argument("--storage", choices=["json", "sqlite"], default="json", help="giveaway store to test")
+    args = parser.parse_args()
+    
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    shutil.copy(os.path.join(ROOT, "plans.json"), workdir)
+    os.chdir(workdir)  # main writes its default config and data files here
+    
+    print(f"Storage {args.storage}, simulated REST latency {args.rest_latency * 1000:.0f}ms, scratch dir {workdir}\n")
+    try:
+        asyncio.run(run(args))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,33 @@
+import aiohttp
 import discord
+from aiohttp import web
+from discord import app_commands
 from discord.ext import commands, tasks
 from discord.ui import View, Button, Select, Modal, TextInput
 import asyncio
+import bisect
+import collections
+import cProfile
+import base64
+import hashlib
 import json
+import logging
+import math
 import os
+import pstats
+import re
 import datetime
+import gzip
+import heapq
 import random
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import traceback
+import zlib
+from array import array
 from typing import Optional
 
 # Load configuration
@@ -26,7 +48,33 @@ def load_config():
                 "partnership": 123456795,
                 "ticket_category": 123456796,
                 "log_channel": 123456797,
-                "giveaway_channel": 123456798
+                "giveaway_channel": 123456798,
+                "ticket_channel": 123456799
+            },
+            "storage": {
+                "giveaways": "json",
+                "archive_after_days": 7
+            },
+            "tickets": {
+                "mode": "channel",
+                "pool_size": 5,
+                "pool_max_size": 20,
+                "idle_warn_minutes": 1440,
+                "idle_close_minutes": 2880
+            },
+            "runtime": {
+                "profile": "full",
+                "member_cache": [],
+                "max_messages": 0,
+                "http_port": 8080,
+                "loop_lag_threshold_ms": 500,
+                "shard_count": 0,
+                "shard_ids": []
+            },
+            "coordination": {
+                "enabled": False,
+                "lease_path": "coordination.db",
+                "lease_seconds": 10
             }
         }
         with open('config.json', 'w') as f:
@@ -35,121 +83,1701 @@ def load_config():
 
 config = load_config()
 CHANNELS = config["channel_ids"]
+STORAGE = config.get("storage", {})
+TICKETS = config.get("tickets", {})
+RUNTIME = config.get("runtime", {})
+LEAN = RUNTIME.get("profile", "full") == "lean"
+COORDINATION = config.get("coordination", {})
+if COORDINATION.get("enabled") and STORAGE.get("giveaways", "json") != "sqlite":
+    sys.exit("❌ Running several instances needs storage.giveaways set to \"sqlite\", the JSON store belongs to one process")
+if COORDINATION.get("enabled") and TICKETS.get("mode", "channel") == "pool":
+    sys.exit("❌ Running several instances doesn't support tickets.mode \"pool\", each instance would hand out the same pool channels")
+
+# Sharding. SHARD_COUNT and SHARD_IDS in the environment override the config so
+# each process of a multi-process deployment can be given its own shards.
+SHARD_COUNT = int(os.getenv("SHARD_COUNT") or RUNTIME.get("shard_count", 0))  # 0 runs unsharded
+SHARD_IDS = [int(shard_id) for shard_id in os.getenv("SHARD_IDS", "").split(",") if shard_id.strip()] or RUNTIME.get("shard_ids") or None
+LOCAL_SHARDS = (SHARD_IDS or list(range(SHARD_COUNT))) if SHARD_COUNT else [None]
+
+def shard_for(guild_id):
+    """The local shard whose state holds a guild's giveaways and tickets"""
+    if not SHARD_COUNT or guild_id is None:
+        return LOCAL_SHARDS[0]
+    shard_id = (guild_id >> 22) % SHARD_COUNT
+    return shard_id if shard_id in LOCAL_SHARDS else LOCAL_SHARDS[0]  # Events only arrive for local guilds
+
+def shard_path(path, shard_id):
+    """Per-shard state file name, e.g. giveaways.json -> giveaways.shard3.json"""
+    if shard_id is None:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard{shard_id}{ext}"
 
 # Bot configuration
-intents = discord.Intents.all()
-bot = commands.Bot(command_prefix='!', intents=intents)
+def lean_intents():
+    """The gateway events the bot actually reads.
+    
+    Interactions and messages carry the author's member data (roles, boosts,
+    permissions), so the members and presence intents aren't needed.
+    """
+    intents = discord.Intents.none()
+    intents.guilds = True  # Channel cache and channel/thread delete events
+    intents.guild_messages = True  # Prefix commands and ticket activity
+    intents.message_content = True  # Reading prefix commands
+    return intents
+
+bot_options = {}
+if LEAN:
+    intents = lean_intents()
+    member_cache_flags = discord.MemberCacheFlags.none()
+    for flag in RUNTIME.get("member_cache", []):
+        setattr(member_cache_flags, flag, True)
+    bot_options.update(
+        member_cache_flags=member_cache_flags,
+        max_messages=RUNTIME.get("max_messages") or None,  # 0 turns the message cache off
+        chunk_guilds_at_startup=False
+    )
+else:
+    intents = discord.Intents.all()
+
+if SHARD_COUNT:
+    bot = commands.AutoShardedBot(command_prefix='!', intents=intents, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS, **bot_options)
+else:
+    bot = commands.Bot(command_prefix='!', intents=intents, **bot_options)
+
+async def resolve_channel(channel_id):
+    """Return a channel from the cache, fetching it if the cache doesn't have it"""
+    if not channel_id:
+        return None
+    channel = bot.get_channel(channel_id)
+    if channel is None:
+        try:
+            channel = await bot.fetch_channel(channel_id)
+        except (discord.NotFound, discord.Forbidden):
+            return None
+    return channel
+
+def current_rss():
+    """Resident memory of this process in bytes"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # Peak rather than current outside Linux
+
+memory_baseline = {}  # RSS before the gateway fills the caches, set in setup_hook
+
+# Metrics
+METRIC_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    """Latency histogram rendered in the Prometheus text format, optionally split by one label"""
+    def __init__(self, name, help_text, label=None, buckets=METRIC_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = buckets
+        self.counts = {}  # Label value -> per-bucket counts, the last one being +Inf
+        self.sums = collections.defaultdict(float)
+    
+    def observe(self, value, label_value=""):
+        counts = self.counts.get(label_value)
+        if counts is None:
+            counts = self.counts[label_value] = [0] * (len(self.buckets) + 1)
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sums[label_value] += value
+    
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_value, counts in self.counts.items():
+            labels = f'{self.label}="{label_value}",' if self.label else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels}le="{bound}"}} {cumulative}')
+            suffix = f"{{{labels.rstrip(',')}}}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {self.sums[label_value]}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+class RateLimitCounter(logging.Handler):
+    """Counts the 429s discord.py retries internally, which never reach our code as errors"""
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.count = 0
+    
+    def emit(self, record):
+        if "rate limited" in record.getMessage():
+            self.count += 1
+
+ack_latency = Histogram("discord_interaction_ack_seconds", "Time from an interaction being created to our first response")
+save_duration = Histogram("giveaway_save_seconds", "Duration of save_giveaways")
+ticket_duration = Histogram("ticket_create_seconds", "Time to create a ticket and post its greeting")
+outbound_duration = Histogram("outbound_call_seconds", "Duration of Discord API calls made through the outbound scheduler", "route")
+http_rate_limits = RateLimitCounter()
+logging.getLogger("discord.http").addHandler(http_rate_limits)
+
+def record_ack(interaction):
+    ack_latency.observe(max(time.time() - interaction.created_at.timestamp(), 0.0))
+
+# Event loop watchdog
+LOOP_HEARTBEAT_INTERVAL = 0.1
+LOOP_LAG_THRESHOLD = RUNTIME.get("loop_lag_threshold_ms", 500) / 1000  # Stalls longer than this get their stack logged
+PROFILE_DIR = "profiles"
+PROFILE_MAX_SECONDS = 300
+
+loop_lag = Histogram("event_loop_lag_seconds", "How late the event loop heartbeat woke up")
+
+def describe_activity(frame):
+    """Name the command or interaction being handled somewhere in a call stack"""
+    while frame is not None:
+        variables = frame.f_locals
+        ctx = variables.get("ctx")
+        if isinstance(ctx, commands.Context):
+            return f"!{ctx.command} by {ctx.author} in #{ctx.channel}"
+        interaction = variables.get("interaction")
+        if isinstance(interaction, discord.Interaction):
+            action = (interaction.data or {}).get("custom_id") or (interaction.data or {}).get("name")
+            return f"interaction {action} by {interaction.user} in #{interaction.channel}"
+        frame = frame.f_back
+    return None
+
+class LoopWatchdog:
+    """Measures event loop lag and logs what the loop was stuck on.
+    
+    A coroutine stamps a heartbeat every interval. A separate thread checks the
+    stamp, and once it falls behind by more than the threshold it prints the
+    loop thread's stack along with the command or interaction being handled.
+    """
+    def __init__(self, interval=LOOP_HEARTBEAT_INTERVAL, threshold=LOOP_LAG_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self.last_beat = time.monotonic()
+        self.stalls = 0
+        self._loop_thread = None
+        self._thread = None
+        self._task = None
+    
+    def start(self):
+        self._loop_thread = threading.get_ident()
+        self.last_beat = time.monotonic()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._beat())
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._thread.start()
+    
+    async def _beat(self):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self.last_beat = time.monotonic()
+            loop_lag.observe(max(self.last_beat - started - self.interval, 0.0))
+    
+    def _watch(self):
+        reported = False
+        while True:
+            time.sleep(self.interval)
+            lag = time.monotonic() - self.last_beat - self.interval
+            if lag < self.threshold:
+                reported = False
+            elif not reported:
+                reported = True  # One report per stall
+                self.stalls += 1
+                self._report(lag)
+    
+    def _report(self, lag):
+        frame = sys._current_frames().get(self._loop_thread)
+        if frame is None:
+            return
+        activity = describe_activity(frame)
+        print(
+            f"⚠️ Event loop blocked for {lag * 1000:.0f}ms"
+            + (f" while handling {activity}" if activity else "")
+            + ":\n" + "".join(traceback.format_stack(frame))
+        )
+
+loop_watchdog = LoopWatchdog()
+profile_lock = asyncio.Lock()
 
 # Data storage
 GIVEAWAY_FILE = "giveaways.json"
+GIVEAWAY_JOURNAL_FILE = "giveaways.journal"
+GIVEAWAY_DB_FILE = STORAGE.get("sqlite_path", "giveaways.db")
+SHARED_STATE_DB = GIVEAWAY_DB_FILE if COORDINATION.get("enabled") else None  # Ticket and plan post state every instance must see
+JOURNAL_COMMIT_WINDOW = 0.2  # Seconds to wait so concurrent writes share one commit
+JOURNAL_COMPACT_THRESHOLD = 5000  # Journal records before folding into the snapshot
+GIVEAWAY_END_CONCURRENCY = 25  # Giveaways finished in parallel when several expire together
+API_RETRIES = 3
+ENTRY_COUNT_INTERVAL = 10  # Seconds between live entrant-count edits on a giveaway message
+GIVEAWAY_ARCHIVE_DIR = "giveaway_archive"
+GIVEAWAY_ARCHIVE_AFTER = STORAGE.get("archive_after_days", 7) * 86400  # Ended giveaways leave the working set after this
+GIVEAWAY_ARCHIVE_CACHE = 8  # Archived giveaways kept loaded after a reroll or lookup
+TICKETS_FILE = "tickets.json"
+LEGACY_IMPORT_MARKER = "legacy_import.done"  # Written per shard once the unsharded files have been split into it
+TICKET_WORKERS = 4  # Ticket channels created in parallel
+TICKET_QUEUE_SIZE = 1000  # Ticket requests allowed to wait before new ones are turned away
+TICKET_RESERVATION_TIMEOUT = 300  # Seconds before a ticket left half-created by a crashed instance can be opened again
+TICKET_POOL_NAME = "ticket-pool"
+TICKET_POOL_REFILL_INTERVAL = 30  # Seconds between pool top-ups when nothing is claimed
+TICKET_POOL_LEAD_MINUTES = 5  # Keep enough channels for this many minutes at the measured open rate
+TICKET_IDLE_WARN = TICKETS.get("idle_warn_minutes", 1440) * 60  # 0 closes without a warning first
+TICKET_IDLE_CLOSE = TICKETS.get("idle_close_minutes", 2880) * 60  # 0 disables auto-close
+TICKET_WHEEL_TICK = 60  # Seconds per timing wheel slot
+TRANSCRIPT_DIR = "transcripts"
+TRANSCRIPT_EXPORTS = 3  # Transcripts streamed at once; more wait their turn
+TRANSCRIPT_PAGE = 100  # Messages fetched and compressed per step, which bounds memory per export
+AUDIT_FILE = "audit.jsonl"
+AUDIT_FLUSH_INTERVAL = 5  # Seconds between audit digests when events trickle in
+AUDIT_DIGEST_SIZE = 10  # Events per log_channel message; a full batch is sent straight away
+EMBED_MAX_CHARS = 6000  # Discord's limit on the combined text of one embed
 
 # Plan configurations
-PLANS = {
+PLANS_FILE = "plans.json"
+
+def load_plans(required=False):
+    """Read plans.json; a missing file is only an error when `required`"""
+    try:
+        with open(PLANS_FILE, 'r', encoding='utf-8') as f:
+            plans = json.load(f)
+    except FileNotFoundError:
+        if required:
+            raise
+        print(f"⚠️ {PLANS_FILE} not found, starting with an empty plan catalog")
+        return {}
+    if not isinstance(plans, dict) or not all(
+        isinstance(category_plans, dict) and all(isinstance(details, dict) for details in category_plans.values())
+        for category_plans in plans.values()
+    ):
+        raise ValueError("expected {category: {plan name: {detail: value}}}")
+    return plans
+
+class PlanCatalog:
+    """Sorted token index over plan names and specs for prefix lookups"""
+    def __init__(self, plans):
+        self.rebuild(plans)
+    
+    @staticmethod
+    def _tokens(*values):
+        tokens = set()
+        for value in values:
+            text = str(value).lower()
+            tokens.add(text.replace(" ", ""))
+            tokens.update(text.split())
+            tokens.update(re.findall(r"[a-z]+|\d+(?:\.\d+)?", text))
+        return tokens
+    
+    def rebuild(self, plans):
+        entries = []
+        keys = []
+        for category, category_plans in plans.items():
+            for plan_name, details in category_plans.items():
+                for token in self._tokens(category, plan_name, *details.values()):
+                    keys.append((token, len(entries)))
+                entries.append((category, plan_name, details))
+        keys.sort()
+        self.entries = entries
+        self._by_key = {(entry[0], entry[1]): entry for entry in entries}
+        self._tokens_sorted = [token for token, _ in keys]
+        self._entry_ids = [entry_id for _, entry_id in keys]
+    
+    def _prefix_matches(self, term):
+        start = bisect.bisect_left(self._tokens_sorted, term)
+        end = bisect.bisect_left(self._tokens_sorted, term + "\uffff", start)
+        return set(self._entry_ids[start:end])
+    
+    def get(self, category, plan_name):
+        return self._by_key.get((category, plan_name))
+    
+    def find(self, query, limit=25):
+        """Plans matching every word of `query` as a prefix, in catalog order"""
+        matches = None
+        for term in query.lower().split():
+            term_matches = self._prefix_matches(term)
+            matches = term_matches if matches is None else matches & term_matches
+            if not matches:
+                return []
+        if matches is None:
+            return self.entries[:limit]
+        return [self.entries[entry_id] for entry_id in sorted(matches)[:limit]]
+
+# How each plan category is rendered; fields are str.format()ed with the plan's details
+PLAN_LAYOUTS = {
     "minecraft": {
-        "Basic": {"price": "$2", "ram": "4GB", "cpu": "400%", "ssd": "Fast Storage"},
-        "Standard": {"price": "$4", "ram": "8GB", "cpu": "500%", "ssd": "Fast Storage"},
-        "Advanced": {"price": "$6", "ram": "12GB", "cpu": "600%", "ssd": "Fast NVMe"},
-        "Pro": {"price": "$10", "ram": "16GB", "cpu": "700%", "ssd": "Fast NVMe"},
-        "Ultra": {"price": "$12", "ram": "24GB", "cpu": "800%", "ssd": "Ultra NVMe"},
-        "Mega": {"price": "$16", "ram": "32GB", "cpu": "1000%", "ssd": "Ultra NVMe"}
+        "label": "Minecraft",
+        "title": "💎・Premium Minecraft Hosting Plans",
+        "description": "✨ Get **high-performance Minecraft servers** at **super affordable prices** 💠\n💾 SSD / NVMe Storage ｜ ⚙️ Powerful CPU ｜ 💻 Full Panel ｜ 🧠 DDoS Protection\n",
+        "color": 0x5865F2,
+        "plan_name": "💎 **{name} Plan** — {price} / Month",
+        "plan_value": "🐏 RAM - **{ram}**\n💾 SSD - **{ssd}**\n⚡ CPU - **{cpu}**",
+        "inline": False,
+        "extra_name": "⚙️ All Plans Include:",
+        "extra_value": "> 🌐 Free Subdomain\n> 🧠 DDoS Protection\n> 💻 Full Panel Access\n> 🧾 Permanent Server\n> 🕓 24/7 Uptime\n> 🎯 Fast Setup\n> 🧰 Plugin / Mods Supported\n\n> 💠 **Lapis Nodes** — *Performance • Power • Trust* 🚀"
     },
     "vps": {
-        "Starter VPS": {"price": "$5", "ram": "2GB", "cpu": "2 vCPU", "storage": "40GB SSD", "bandwidth": "1TB"},
-        "Business VPS": {"price": "$10", "ram": "4GB", "cpu": "4 vCPU", "storage": "80GB NVMe", "bandwidth": "2TB"},
-        "Pro VPS": {"price": "$20", "ram": "8GB", "cpu": "6 vCPU", "storage": "160GB NVMe", "bandwidth": "4TB"},
-        "Enterprise VPS": {"price": "$40", "ram": "16GB", "cpu": "8 vCPU", "storage": "320GB NVMe", "bandwidth": "Unlimited"}
+        "label": "VPS",
+        "title": "💻・VPS Hosting Plans",
+        "description": "🚀 **High-performance Virtual Private Servers** with full root access\n⚡ SSD/NVMe Storage ｜ 🔒 Full Root Access ｜ 🌐 Global Locations ｜ 🔄 Daily Backups\n",
+        "color": 0x00ff00,
+        "plan_name": "💻 **{name}** — {price} / Month",
+        "plan_value": "🐏 RAM - **{ram}**\n💾 Storage - **{storage}**\n⚡ CPU - **{cpu}**\n🌐 Bandwidth - **{bandwidth}**",
+        "inline": True,
+        "extra_name": "🔧 All VPS Plans Include:",
+        "extra_value": "> 🔒 Full Root Access\n> 🌐 Multiple OS Choices\n> 🔄 Daily Backups\n> 🛡️ DDoS Protection\n> 💾 SSD/NVMe Storage\n> 🚀 Instant Deployment"
     },
     "developer": {
-        "Basic Dev": {"price": "$3", "ram": "2GB", "storage": "20GB", "features": "Database + Domain"},
-        "Pro Dev": {"price": "$8", "ram": "4GB", "storage": "50GB", "features": "Premium Support + SSL"},
-        "Team Dev": {"price": "$15", "ram": "8GB", "storage": "100GB", "features": "Multiple Projects + CI/CD"}
+        "label": "Developer",
+        "title": "👨‍💻・Minecraft Developer Plans",
+        "description": "🛠️ **Specialized hosting for developers** with extra features\n🔧 Database Access ｜ 🌐 Domain Support ｜ 🚀 Development Tools ｜ 📦 Git Integration\n",
+        "color": 0xFFA500,
+        "plan_name": "🔧 **{name}** — {price} / Month",
+        "plan_value": "🐏 RAM - **{ram}**\n💾 Storage - **{storage}**\n✨ Features - **{features}**",
+        "inline": True,
+        "extra_name": "🚀 Developer Features:",
+        "extra_value": "> 📦 Git Integration\n> 🗄️ Database Support\n> 🔧 API Access\n> 🚀 CI/CD Pipelines\n> 🌐 Staging Environments\n> 📊 Analytics Dashboard"
     },
     "domain": {
-        ".com": {"price": "$10/year", "transfer": "Free", "features": "Free Privacy Protection + Email"},
-        ".net": {"price": "$12/year", "transfer": "Free", "features": "Free DNS Management + SSL"},
-        ".org": {"price": "$8/year", "transfer": "Free", "features": "Free Email Forwarding + Privacy"},
-        ".io": {"price": "$30/year", "transfer": "$10", "features": "Premium Domain + Business Email"}
+        "label": "Domain",
+        "title": "🌐・Domain Registration Plans",
+        "description": "🔗 **Register your perfect domain name** with premium features\n🛡️ Privacy Protection ｜ 📧 Email Forwarding ｜ 🔄 Easy Transfer ｜ 🔒 SSL Certificates\n",
+        "color": 0x9b59b6,
+        "plan_name": "🌐 **{name}** — {price}",
+        "plan_value": "🔄 Transfer - **{transfer}**\n⭐ {features}",
+        "inline": True,
+        "extra_name": "🔒 Domain Features:",
+        "extra_value": "> 🛡️ Free Privacy Protection\n> 📧 Email Forwarding\n> 🔄 Easy Domain Transfer\n> 🔒 Free SSL Certificate\n> 🌐 DNS Management\n> 📊 Domain Analytics"
     },
     "booster": {
-        "Server Booster": {"price": "Free", "benefits": "Discord Perks + Priority Support"},
-        "Premium Booster": {"price": "$5/month", "benefits": "Enhanced Features + VIP Role"},
-        "Ultra Booster": {"price": "$10/month", "benefits": "All Features + Custom Emojis"}
+        "label": "Booster",
+        "title": "🚀・Server Booster Plans",
+        "description": "🌟 **Enhance your Discord experience** with booster perks\n🎨 Custom Colors ｜ 🔊 Audio Quality ｜ 🏆 Priority Support ｜ ✨ Exclusive Rewards\n",
+        "color": 0xe91e63,
+        "plan_name": "🌟 **{name}** — {price}",
+        "plan_value": "🎁 {benefits}",
+        "inline": True,
+        "extra_name": "✨ Booster Benefits:",
+        "extra_value": "> 🎨 Custom Color Roles\n> 🔊 Enhanced Audio Quality\n> 🏆 Priority Support\n> ✨ Exclusive Emojis\n> 📢 Special Announcements\n> 🎁 Monthly Rewards"
     },
     "youtuber": {
-        "Starter Pack": {"price": "Free", "subs": "1K+", "benefits": "Basic Promotion + Shoutout"},
-        "Growth Pack": {"price": "Custom", "subs": "5K+", "benefits": "Featured Promotion + Partnership"},
-        "Pro Pack": {"price": "Sponsored", "subs": "10K+", "benefits": "Full Sponsorship + Revenue Share"}
+        "label": "YouTuber",
+        "title": "📹・YouTuber & Creator Plans",
+        "description": "🎬 **Special offers for content creators** and influencers\n📢 Promotion ｜ 🤝 Partnership ｜ 🎁 Free Resources ｜ 💰 Revenue Sharing\n",
+        "color": 0xff0000,
+        "plan_name": "📹 **{name}** — {price}",
+        "plan_value": "📊 Subs - **{subs}**\n✨ {benefits}",
+        "inline": True,
+        "extra_name": "🎬 Creator Benefits:",
+        "extra_value": "> 📢 Social Media Promotion\n> 🤝 Partnership Opportunities\n> 🎁 Free Resources & Hosting\n> 💰 Revenue Sharing\n> 🚀 Early Access Features\n> 📊 Analytics Support"
     }
 }
 
-# Giveaway system
-class GiveawaySystem:
+PLAN_POSTS_FILE = "plan_posts.json"
+
+class JsonPlanPosts:
+    """Where each plan category was last posted, kept in plan_posts.json"""
+    def __init__(self, path=PLAN_POSTS_FILE):
+        self.path = path
+        self.posts = self.load_posts()
+        self._save_lock = asyncio.Lock()
+    
+    def load_posts(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+    
+    def get(self, plan_type):
+        return self.posts.get(plan_type)
+    
+    async def set(self, plan_type, post):
+        self.posts[plan_type] = post
+        await self.save_posts()
+    
+    async def discard_messages(self, message_ids):
+        """Forget posts whose message was deleted so the next post_plan sends a fresh one"""
+        deleted = [plan_type for plan_type, post in self.posts.items() if post["message_id"] in message_ids]
+        for plan_type in deleted:
+            del self.posts[plan_type]
+        if deleted:
+            await self.save_posts()
+    
+    async def save_posts(self):
+        async with self._save_lock:
+            data = json.dumps(self.posts, indent=4)
+            await asyncio.to_thread(self._write_posts, data)
+    
+    def _write_posts(self, data):
+        with open(self.path, 'w') as f:
+            f.write(data)
+
+class SQLitePlanPosts:
+    """Plan posts in the shared database, so every instance edits the same messages"""
+    def __init__(self, path):
+        self.db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS plan_posts ("
+            "plan_type TEXT PRIMARY KEY, channel_id INTEGER NOT NULL, message_id INTEGER NOT NULL, hash TEXT NOT NULL)"
+        )
+    
+    def get(self, plan_type):
+        row = self.db.execute("SELECT channel_id, message_id, hash FROM plan_posts WHERE plan_type = ?", (plan_type,)).fetchone()
+        return dict(row) if row else None
+    
+    async def set(self, plan_type, post):
+        self.db.execute(
+            "INSERT OR REPLACE INTO plan_posts (plan_type, channel_id, message_id, hash) VALUES (?, ?, ?, ?)",
+            (plan_type, post["channel_id"], post["message_id"], post["hash"])
+        )
+    
+    async def discard_messages(self, message_ids):
+        self.db.executemany("DELETE FROM plan_posts WHERE message_id = ?", [(message_id,) for message_id in message_ids])
+
+class PlanEmbedCache:
+    """Plan embeds compiled once from PLANS, each tagged with a hash of its content"""
     def __init__(self):
+        self.embeds = {}
+        self.hashes = {}
+        self.posts = SQLitePlanPosts(SHARED_STATE_DB) if SHARED_STATE_DB else JsonPlanPosts()
+    
+    def rebuild(self, plans):
+        """Recompile every category from `plans`; nothing changes if a plan doesn't fit its layout"""
+        embeds = {}
+        hashes = {}
+        for plan_type, layout in PLAN_LAYOUTS.items():
+            embed = discord.Embed(title=layout["title"], description=layout["description"], color=layout["color"])
+            for plan_name, details in plans.get(plan_type, {}).items():
+                try:
+                    embed.add_field(
+                        name=layout["plan_name"].format(name=plan_name, **details),
+                        value=layout["plan_value"].format(name=plan_name, **details),
+                        inline=layout["inline"]
+                    )
+                except (KeyError, IndexError) as e:
+                    raise ValueError(f"{plan_type} plan {plan_name!r} is missing {e}") from None
+            embed.add_field(name=layout["extra_name"], value=layout["extra_value"], inline=False)
+            payload = json.dumps(embed.to_dict(), sort_keys=True)
+            embeds[plan_type] = embed
+            hashes[plan_type] = hashlib.sha256(payload.encode()).hexdigest()
+        self.embeds, self.hashes = embeds, hashes
+
+plan_embeds = PlanEmbedCache()
+try:
+    PLANS = load_plans()
+    plan_embeds.rebuild(PLANS)
+except ValueError as e:
+    print(f"⚠️ {PLANS_FILE} could not be loaded ({e}), starting with an empty plan catalog")
+    PLANS = {}
+    plan_embeds.rebuild(PLANS)
+plan_catalog = PlanCatalog(PLANS)
+
+# Giveaway deadlines
+def to_epoch(end_time):
+    """Epoch seconds for a stored end time, accepting the older ISO string form"""
+    if isinstance(end_time, str):
+        end_time = datetime.datetime.fromisoformat(end_time)
+        if end_time.tzinfo is None:
+            end_time = end_time.astimezone()  # Naive times were written in local time
+        return end_time.timestamp()
+    return end_time
+
+class DeadlineScheduler:
+    """Min-heap of (deadline, key) that sleeps exactly until the earliest one"""
+    def __init__(self):
+        self._heap = []
+        self._scheduled = {}  # Key -> deadline, so rescheduling the same deadline is a no-op
+        self._wakeup = asyncio.Event()
+    
+    def __len__(self):
+        return len(self._heap)
+    
+    def schedule(self, key, deadline):
+        if self._scheduled.get(key) == deadline:
+            return
+        self._scheduled[key] = deadline
+        heapq.heappush(self._heap, (deadline, key))
+        if self._heap[0][1] == key:
+            self._wakeup.set()
+    
+    async def wait_due(self):
+        while True:
+            now = time.time()
+            due = []
+            while self._heap and self._heap[0][0] <= now:
+                deadline, key = heapq.heappop(self._heap)
+                if self._scheduled.get(key) == deadline:
+                    del self._scheduled[key]
+                due.append(key)
+            if due:
+                return due
+            timeout = self._heap[0][0] - now if self._heap else None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+# Giveaway participants
+class FenwickTree:
+    """Prefix sums of entry weights with O(log n) append, update and weighted lookup"""
+    __slots__ = ("_tree", "total")
+    
+    def __init__(self, weights=()):
+        self._tree = array('Q', [0])
+        self._tree.extend(iter(weights))
+        self.total = 0
+        size = len(self._tree) - 1
+        for i in range(1, size + 1):
+            self.total += weights[i - 1]
+            parent = i + (i & -i)
+            if parent <= size:
+                self._tree[parent] += self._tree[i]
+    
+    def __len__(self):
+        return len(self._tree) - 1
+    
+    def _prefix(self, i):
+        total = 0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+    
+    def append(self, weight):
+        i = len(self._tree)
+        self._tree.append(weight + self._prefix(i - 1) - self._prefix(i - (i & -i)))
+        self.total += weight
+    
+    def add(self, position, delta):
+        i = position + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+        self.total += delta
+    
+    def find(self, target):
+        """Position whose cumulative weight range contains `target` (0 <= target < total)"""
+        position = 0
+        step = 1 << (len(self).bit_length() - 1) if len(self) else 0
+        while step:
+            if position + step <= len(self) and self._tree[position + step] <= target:
+                position += step
+                target -= self._tree[position]
+            step >>= 1
+        return position
+
+class ParticipantSet:
+    """Entrant IDs packed in entry order, with a hash index for O(1) lookups.
+    
+    Weights are only tracked once some entrant has more than one entry, so
+    unweighted giveaways pay nothing for them.
+    """
+    __slots__ = ("_order", "_index", "_weights", "tree")
+    
+    def __init__(self, user_ids=(), weights=None):
+        self._order = array('Q')
+        self._index = {}
+        self._weights = None
+        self.tree = None
+        for position, user_id in enumerate(user_ids):
+            self.add(user_id, weights[position] if weights else 1)
+    
+    def __len__(self):
+        return len(self._order)
+    
+    def __contains__(self, user_id):
+        return user_id in self._index
+    
+    def __getitem__(self, position):
+        return self._order[position]
+    
+    def __iter__(self):
+        return iter(self._order)
+    
+    @property
+    def weighted(self):
+        return self._weights is not None
+    
+    def add(self, user_id, weight=1):
+        if user_id in self._index:
+            return False
+        if weight != 1 and self._weights is None:
+            self._weights = array('I', [1]) * len(self._order)
+            self.tree = FenwickTree(self._weights)
+        self._index[user_id] = len(self._order)
+        self._order.append(user_id)
+        if self._weights is not None:
+            self._weights.append(weight)
+            self.tree.append(weight)
+        return True
+    
+    def position(self, user_id):
+        return self._index[user_id]
+    
+    def weight(self, position):
+        return self._weights[position] if self._weights is not None else 1
+    
+    @staticmethod
+    def _pack(values):
+        if sys.byteorder != "little":
+            values = array(values.typecode, values)
+            values.byteswap()
+        return base64.b64encode(zlib.compress(values.tobytes())).decode("ascii")
+    
+    @staticmethod
+    def _unpack(typecode, data):
+        values = array(typecode)
+        values.frombytes(zlib.decompress(base64.b64decode(data)))
+        if sys.byteorder != "little":
+            values.byteswap()
+        return values
+    
+    def encode(self):
+        """Compact text form: zlib-compressed little-endian integers in base64"""
+        if self._weights is None:
+            return self._pack(self._order)
+        return {"ids": self._pack(self._order), "weights": self._pack(self._weights)}
+    
+    @classmethod
+    def decode(cls, data):
+        if isinstance(data, list):
+            return cls(data)  # Plain ID list from older snapshots
+        participants = cls()
+        if isinstance(data, dict):
+            participants._order = cls._unpack('Q', data["ids"])
+            participants._weights = cls._unpack('I', data["weights"])
+            participants.tree = FenwickTree(participants._weights)
+        else:
+            participants._order = cls._unpack('Q', data)
+        participants._index = {user_id: position for position, user_id in enumerate(participants._order)}
+        return participants
+
+# Winner draws
+class WinnerDraw:
+    """Partial Fisher-Yates over a ParticipantSet that never moves the real array.
+    
+    Only the slots touched so far are tracked, so drawing k winners is O(k)
+    regardless of entrant count. Slots below `drawn` hold past winners and
+    everything after them is the eligible pool for later rerolls.
+    """
+    def __init__(self, participants, previous_winners=()):
+        self.participants = participants
+        self.drawn = 0
+        self._slots = {}  # Slot -> participant position placed there
+        self._where = {}  # Participant position -> slot it was moved to
+        for user_id in previous_winners:
+            if user_id in participants:
+                position = participants.position(user_id)
+                self._swap(self.drawn, self._where.get(position, position))
+                self.drawn += 1
+    
+    @property
+    def remaining(self):
+        return len(self.participants) - self.drawn
+    
+    def _swap(self, a, b):
+        position_a = self._slots.get(a, a)
+        position_b = self._slots.get(b, b)
+        self._slots[a], self._where[position_b] = position_b, a
+        self._slots[b], self._where[position_a] = position_a, b
+    
+    def draw(self, count):
+        winners = []
+        for _ in range(min(count, self.remaining)):
+            self._swap(self.drawn, random.randrange(self.drawn, len(self.participants)))
+            winners.append(self.participants[self._slots[self.drawn]])
+            self.drawn += 1
+        return winners
+
+class WeightedWinnerDraw:
+    """Weighted draw without replacement over a ParticipantSet's Fenwick tree.
+    
+    Each pick removes the winner's weight so they cannot be picked again.
+    Every removal is put back afterwards, so the stored tree is left as it was.
+    """
+    def __init__(self, participants, previous_winners=()):
+        self.participants = participants
+        self.previous = [user_id for user_id in previous_winners if user_id in participants]
+    
+    @property
+    def remaining(self):
+        return len(self.participants) - len(self.previous)
+    
+    def draw(self, count):
+        tree = self.participants.tree
+        removed = []
+        winners = []
+        try:
+            for user_id in self.previous:
+                position = self.participants.position(user_id)
+                removed.append((position, self.participants.weight(position)))
+                tree.add(position, -removed[-1][1])
+            for _ in range(count):
+                if tree.total <= 0:
+                    break
+                position = tree.find(random.randrange(tree.total))
+                removed.append((position, self.participants.weight(position)))
+                tree.add(position, -removed[-1][1])
+                winners.append(self.participants[position])
+        finally:
+            for position, weight in removed:
+                tree.add(position, weight)
+        self.previous.extend(winners)
+        return winners
+
+def draw_from(participants, previous_winners, count):
+    """Draw up to `count` winners from an in-memory ParticipantSet, skipping previous winners"""
+    draw_type = WeightedWinnerDraw if participants.weighted else WinnerDraw
+    return draw_type(participants, previous_winners).draw(count)
+
+# Giveaway journal
+class GiveawayJournal:
+    """Append-only log of giveaway changes, group-committed off the event loop"""
+    def __init__(self, path):
+        self.path = path
+        self.records = 0
+        self._pending = []
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task = None
+    
+    def replay(self):
+        good = 0  # Bytes up to the end of the last complete record
+        try:
+            with open(self.path, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # Torn final write from a crash
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    good += len(line)
+                    self.records += 1
+                    yield record
+        except FileNotFoundError:
+            return
+        if os.path.getsize(self.path) > good:
+            # Cut the torn tail off so later appends start on a fresh line and replay past it
+            print(f"⚠️ Discarding torn tail of {self.path} after {self.records} records")
+            os.truncate(self.path, good)
+    
+    def append(self, record):
+        self._pending.append(json.dumps(record, separators=(",", ":")))
+        self._wakeup.set()
+    
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+    
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            await asyncio.sleep(JOURNAL_COMMIT_WINDOW)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Error writing giveaway journal: {e}")
+    
+    async def flush(self):
+        async with self._lock:
+            await self._flush_locked()
+    
+    async def _flush_locked(self):
+        self._wakeup.clear()
+        if not self._pending:
+            return
+        lines, self._pending = self._pending, []
+        try:
+            await asyncio.to_thread(self._write, lines)
+        except Exception:
+            self._pending[:0] = lines
+            raise
+        self.records += len(lines)
+    
+    def _write(self, lines):
+        with open(self.path, 'a') as f:
+            f.write("\n".join(lines) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+    
+    async def compact(self, snapshot, snapshot_path):
+        """Write `snapshot()` as the new base file and start an empty journal"""
+        async with self._lock:
+            await self._flush_locked()
+            # Changes made from here on stay pending until the new journal exists
+            data = json.dumps(snapshot(), indent=4)
+            await asyncio.to_thread(self._replace, snapshot_path, data)
+            self.records = 0
+    
+    def _replace(self, snapshot_path, data):
+        tmp_path = snapshot_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, snapshot_path)
+        open(self.path, 'w').close()
+
+# Giveaway stores
+class JsonGiveawayStore:
+    """Every giveaway held in memory, persisted as a JSON snapshot plus journal"""
+    def __init__(self, path=GIVEAWAY_FILE, journal_path=GIVEAWAY_JOURNAL_FILE):
+        self.path = path
+        self.journal = GiveawayJournal(journal_path)
         self.giveaways = self.load_giveaways()
     
+    @classmethod
+    def for_shard(cls, shard_id):
+        return cls(shard_path(GIVEAWAY_FILE, shard_id), shard_path(GIVEAWAY_JOURNAL_FILE, shard_id))
+    
     def load_giveaways(self):
         try:
-            with open(GIVEAWAY_FILE, 'r') as f:
-                return json.load(f)
+            with open(self.path, 'r') as f:
+                giveaways = json.load(f)
         except FileNotFoundError:
-            return {}
+            giveaways = {}
+        for giveaway in giveaways.values():
+            giveaway["participants"] = ParticipantSet.decode(giveaway["participants"])
+            giveaway["end_time"] = to_epoch(giveaway["end_time"])
+            giveaway.setdefault("winner_ids", [])
+        for record in self.journal.replay():
+            self._apply(giveaways, record)
+        return giveaways
+    
+    @staticmethod
+    def _apply(giveaways, record):
+        # Every operation is idempotent so replaying over a newer snapshot is safe
+        op = record["op"]
+        giveaway_id = record["id"]
+        if op == "create":
+            giveaway = record["giveaway"]
+            giveaways[giveaway_id] = {
+                **giveaway,
+                "end_time": to_epoch(giveaway["end_time"]),
+                "participants": ParticipantSet(),
+                "winner_ids": []
+            }
+        elif op == "enter":
+            giveaway = giveaways.get(giveaway_id)
+            if giveaway:
+                giveaway["participants"].add(record["user"], record.get("weight", 1))
+        elif op == "win":
+            giveaway = giveaways.get(giveaway_id)
+            if giveaway:
+                winner_ids = giveaway.setdefault("winner_ids", [])
+                winner_ids.extend(user_id for user_id in record["users"] if user_id not in winner_ids)
+        elif op == "end":
+            if giveaway_id in giveaways:
+                giveaways[giveaway_id]["ended"] = True
+                giveaways[giveaway_id]["ended_at"] = record.get("at", giveaways[giveaway_id]["end_time"])
+        elif op == "delete":
+            giveaways.pop(giveaway_id, None)
+    
+    def _record(self, op, giveaway_id, **fields):
+        record = {"op": op, "id": giveaway_id, **fields}
+        self._apply(self.giveaways, record)
+        self.journal.append(record)
+    
+    def start(self):
+        self.journal.start()
+    
+    async def flush(self):
+        await self.journal.flush()
+    
+    async def compact(self, force=False):
+        if force or self.journal.records >= JOURNAL_COMPACT_THRESHOLD:
+            await self.journal.compact(self._snapshot, self.path)
+    
+    def _snapshot(self):
+        return {
+            giveaway_id: {**giveaway, "participants": giveaway["participants"].encode()}
+            for giveaway_id, giveaway in self.giveaways.items()
+        }
+    
+    def get(self, giveaway_id):
+        return self.giveaways.get(giveaway_id)
+    
+    def has(self, giveaway_id):
+        return giveaway_id in self.giveaways
+    
+    def active(self):
+        active = [(giveaway_id, giveaway) for giveaway_id, giveaway in self.giveaways.items() if not giveaway["ended"]]
+        active.sort(key=lambda item: item[1]["end_time"])
+        return active
+    
+    def ended_before(self, cutoff):
+        return [
+            giveaway_id for giveaway_id, giveaway in self.giveaways.items()
+            if giveaway["ended"] and giveaway.get("ended_at", giveaway["end_time"]) < cutoff
+        ]
+    
+    def pending_deadlines(self, before):
+        return [
+            (giveaway_id, giveaway["end_time"]) for giveaway_id, giveaway in self.giveaways.items()
+            if not giveaway["ended"] and giveaway["end_time"] < before
+        ]
+    
+    def export(self, giveaway_id):
+        giveaway = self.giveaways[giveaway_id]
+        return {**giveaway, "participants": giveaway["participants"].encode()}
+    
+    def create(self, giveaway_id, giveaway):
+        self._record("create", giveaway_id, giveaway=giveaway)
+    
+    def add_participant(self, giveaway_id, user_id, weight=1):
+        if self.has_participant(giveaway_id, user_id):
+            return False
+        if weight == 1:
+            self._record("enter", giveaway_id, user=user_id)
+        else:
+            self._record("enter", giveaway_id, user=user_id, weight=weight)
+        return True
+    
+    def has_participant(self, giveaway_id, user_id):
+        return user_id in self.giveaways[giveaway_id]["participants"]
+    
+    def participant_count(self, giveaway_id):
+        return len(self.giveaways[giveaway_id]["participants"])
+    
+    def participants(self, giveaway_id):
+        return self.giveaways[giveaway_id]["participants"]
+    
+    def draw(self, giveaway_id, count):
+        giveaway = self.giveaways[giveaway_id]
+        return draw_from(giveaway["participants"], giveaway["winner_ids"], count)
+    
+    def add_winners(self, giveaway_id, user_ids):
+        self._record("win", giveaway_id, users=user_ids)
+    
+    def end(self, giveaway_id):
+        self._record("end", giveaway_id, at=time.time())
+    
+    def claim_end(self, giveaway_id):
+        giveaway = self.giveaways.get(giveaway_id)
+        if not giveaway or giveaway["ended"]:
+            return False
+        self.end(giveaway_id)
+        return True
+    
+    def delete(self, giveaway_id):
+        self._record("delete", giveaway_id)
+
+class SQLiteGiveawayStore:
+    """Giveaways and participants in SQLite, queried through indexes instead of held in memory"""
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS giveaways (
+            id INTEGER PRIMARY KEY,
+            channel_id INTEGER NOT NULL,
+            prize TEXT NOT NULL,
+            winners INTEGER NOT NULL,
+            end_time REAL NOT NULL,
+            host_id INTEGER NOT NULL,
+            requirements TEXT NOT NULL DEFAULT '{}',
+            ended INTEGER NOT NULL DEFAULT 0,
+            embed TEXT
+        );
+        CREATE INDEX IF NOT EXISTS giveaways_ended_end_time ON giveaways (ended, end_time);
+        CREATE INDEX IF NOT EXISTS giveaways_host_id ON giveaways (host_id);
+        CREATE TABLE IF NOT EXISTS participants (
+            giveaway_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            weight INTEGER NOT NULL DEFAULT 1,
+            PRIMARY KEY (giveaway_id, user_id)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS winners (
+            giveaway_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            PRIMARY KEY (giveaway_id, user_id)
+        );
+    """
+    
+    def __init__(self, path=GIVEAWAY_DB_FILE):
+        self.path = path
+        self.db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(self.SCHEMA)
+        self._migrate_end_times()
+        self._add_missing_column("participants", "weight", "INTEGER NOT NULL DEFAULT 1")
+        self._add_missing_column("giveaways", "embed", "TEXT")
+        self._add_missing_column("giveaways", "ended_at", "REAL")
+        self._add_missing_column("participants", "reach", "INTEGER")
+        self._migrate_reach()
+        self.db.execute("CREATE INDEX IF NOT EXISTS participants_reach ON participants (giveaway_id, reach)")
+    
+    @classmethod
+    def for_shard(cls, shard_id):
+        return cls(shard_path(GIVEAWAY_DB_FILE, shard_id))
+    
+    def _add_missing_column(self, table, column, definition):
+        columns = [row["name"] for row in self.db.execute(f"PRAGMA table_info({table})")]
+        if column not in columns:
+            self.db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    
+    def _migrate_end_times(self):
+        # Databases created before deadlines were epoch seconds hold ISO strings
+        rows = self.db.execute("SELECT id, end_time FROM giveaways WHERE typeof(end_time) = 'text'").fetchall()
+        with self.db:
+            for row in rows:
+                self.db.execute("UPDATE giveaways SET end_time = ? WHERE id = ?", (to_epoch(row["end_time"]), row["id"]))
+    
+    def _migrate_reach(self):
+        # Participants added before draws used the reach index have none yet
+        giveaway_ids = [row[0] for row in self.db.execute("SELECT DISTINCT giveaway_id FROM participants WHERE reach IS NULL")]
+        with self.db:
+            for giveaway_id in giveaway_ids:
+                reach = 0
+                updates = []
+                for user_id, weight in self.db.execute(
+                    "SELECT user_id, weight FROM participants WHERE giveaway_id = ? ORDER BY user_id", (giveaway_id,)
+                ).fetchall():
+                    reach += weight
+                    updates.append((reach, giveaway_id, user_id))
+                self.db.executemany("UPDATE participants SET reach = ? WHERE giveaway_id = ? AND user_id = ?", updates)
+    
+    def _row_to_giveaway(self, row):
+        winner_rows = self.db.execute("SELECT user_id FROM winners WHERE giveaway_id = ? ORDER BY rowid", (row["id"],))
+        return {
+            "channel_id": row["channel_id"],
+            "prize": row["prize"],
+            "winners": row["winners"],
+            "end_time": row["end_time"],
+            "host_id": row["host_id"],
+            "requirements": json.loads(row["requirements"]),
+            "ended": bool(row["ended"]),
+            "winner_ids": [winner_row[0] for winner_row in winner_rows],
+            "embed": json.loads(row["embed"]) if row["embed"] else None,
+            "ended_at": row["ended_at"]
+        }
+    
+    def start(self):
+        pass
+    
+    async def flush(self):
+        pass  # Every change is committed as it is made
+    
+    async def compact(self, force=False):
+        await asyncio.to_thread(self._checkpoint)
+    
+    def _checkpoint(self):
+        db = sqlite3.connect(self.path)
+        try:
+            db.execute("PRAGMA wal_checkpoint(PASSIVE)")
+        finally:
+            db.close()
+    
+    def get(self, giveaway_id):
+        row = self.db.execute("SELECT * FROM giveaways WHERE id = ?", (int(giveaway_id),)).fetchone()
+        return self._row_to_giveaway(row) if row else None
+    
+    def has(self, giveaway_id):
+        return self.db.execute("SELECT 1 FROM giveaways WHERE id = ?", (int(giveaway_id),)).fetchone() is not None
+    
+    def active(self):
+        rows = self.db.execute("SELECT * FROM giveaways WHERE ended = 0 ORDER BY end_time")
+        return [(str(row["id"]), self._row_to_giveaway(row)) for row in rows]
+    
+    def ended_before(self, cutoff):
+        rows = self.db.execute(
+            "SELECT id FROM giveaways WHERE ended = 1 AND COALESCE(ended_at, end_time) < ?",
+            (cutoff,)
+        )
+        return [str(row[0]) for row in rows]
+    
+    def pending_deadlines(self, before):
+        rows = self.db.execute("SELECT id, end_time FROM giveaways WHERE ended = 0 AND end_time < ?", (before,))
+        return [(str(row[0]), row[1]) for row in rows]
+    
+    def export(self, giveaway_id):
+        return {**self.get(giveaway_id), "participants": self.participants(giveaway_id).encode()}
+    
+    def create(self, giveaway_id, giveaway):
+        self.db.execute(
+            "INSERT OR REPLACE INTO giveaways (id, channel_id, prize, winners, end_time, host_id, requirements, ended, embed) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (int(giveaway_id), giveaway["channel_id"], giveaway["prize"], giveaway["winners"],
+             giveaway["end_time"], giveaway["host_id"], json.dumps(giveaway["requirements"]), int(giveaway["ended"]),
+             json.dumps(giveaway["embed"]) if giveaway.get("embed") else None)
+        )
+    
+    def add_participant(self, giveaway_id, user_id, weight=1):
+        # reach is the running weight total up to and including this entrant, which lets
+        # a draw find the entrant at any point of the total with one index lookup
+        cursor = self.db.execute(
+            "INSERT OR IGNORE INTO participants (giveaway_id, user_id, weight, reach) "
+            "SELECT ?, ?, ?, ? + COALESCE(MAX(reach), 0) FROM participants WHERE giveaway_id = ?",
+            (int(giveaway_id), user_id, weight, weight, int(giveaway_id))
+        )
+        return cursor.rowcount == 1
+    
+    def has_participant(self, giveaway_id, user_id):
+        row = self.db.execute(
+            "SELECT 1 FROM participants WHERE giveaway_id = ? AND user_id = ?",
+            (int(giveaway_id), user_id)
+        ).fetchone()
+        return row is not None
+    
+    def participant_count(self, giveaway_id):
+        return self.db.execute("SELECT COUNT(*) FROM participants WHERE giveaway_id = ?", (int(giveaway_id),)).fetchone()[0]
+    
+    def participants(self, giveaway_id):
+        rows = self.db.execute("SELECT user_id, weight FROM participants WHERE giveaway_id = ?", (int(giveaway_id),)).fetchall()
+        if any(row[1] != 1 for row in rows):
+            return ParticipantSet([row[0] for row in rows], [row[1] for row in rows])
+        return ParticipantSet(row[0] for row in rows)
+    
+    def draw(self, giveaway_id, count):
+        """Pick winners with one O(log n) index lookup each, without loading every entrant.
+        
+        A pick takes a random point in the giveaway's weight total and finds the
+        entrant whose reach covers it; past winners are redrawn. Once past winners
+        hold most of the weight, redraws would dominate, so the rest is drawn in
+        memory. That only happens when the remaining weight is smaller than the
+        winners' own, so few entrants are loaded.
+        """
+        giveaway_id = int(giveaway_id)
+        total_weight = self.db.execute(
+            "SELECT COALESCE(MAX(reach), 0) FROM participants WHERE giveaway_id = ?", (giveaway_id,)
+        ).fetchone()[0]
+        # LEFT JOIN keeps winners as the outer loop, so this is one primary key lookup per past winner
+        past_winners = self.db.execute(
+            "SELECT w.user_id, COALESCE(p.weight, 0) FROM winners w LEFT JOIN participants p "
+            "ON p.giveaway_id = w.giveaway_id AND p.user_id = w.user_id WHERE w.giveaway_id = ?",
+            (giveaway_id,)
+        ).fetchall()
+        taken = {row[0] for row in past_winners}
+        taken_weight = sum(row[1] for row in past_winners)
+        winners = []
+        while len(winners) < count and taken_weight < total_weight:
+            if taken_weight * 2 > total_weight:
+                winners += draw_from(self.participants(giveaway_id), taken, count - len(winners))
+                break
+            row = self.db.execute(
+                "SELECT user_id, weight FROM participants WHERE giveaway_id = ? AND reach > ? ORDER BY reach LIMIT 1",
+                (giveaway_id, random.randrange(total_weight))
+            ).fetchone()
+            if row[0] in taken:
+                continue
+            winners.append(row[0])
+            taken.add(row[0])
+            taken_weight += row[1]
+        return winners
+    
+    def add_winners(self, giveaway_id, user_ids):
+        with self.db:
+            self.db.executemany(
+                "INSERT OR IGNORE INTO winners (giveaway_id, user_id) VALUES (?, ?)",
+                [(int(giveaway_id), user_id) for user_id in user_ids]
+            )
+    
+    def end(self, giveaway_id):
+        self.db.execute("UPDATE giveaways SET ended = 1, ended_at = ? WHERE id = ?", (time.time(), int(giveaway_id)))
+    
+    def claim_end(self, giveaway_id):
+        # Only one instance sharing the database sees its update succeed
+        cursor = self.db.execute(
+            "UPDATE giveaways SET ended = 1, ended_at = ? WHERE id = ? AND ended = 0",
+            (time.time(), int(giveaway_id))
+        )
+        return cursor.rowcount == 1
+    
+    def delete(self, giveaway_id):
+        with self.db:
+            self.db.execute("DELETE FROM participants WHERE giveaway_id = ?", (int(giveaway_id),))
+            self.db.execute("DELETE FROM winners WHERE giveaway_id = ?", (int(giveaway_id),))
+            self.db.execute("DELETE FROM giveaways WHERE id = ?", (int(giveaway_id),))
+
+GIVEAWAY_STORES = {
+    "json": JsonGiveawayStore,
+    "sqlite": SQLiteGiveawayStore
+}
+
+class GiveawayArchive:
+    """Ended giveaways moved out of the store, one JSON file each, read only when asked for"""
+    def __init__(self, path=GIVEAWAY_ARCHIVE_DIR):
+        self.path = path
+        self._cache = collections.OrderedDict()
+        self._write_lock = asyncio.Lock()
+    
+    def _file(self, giveaway_id):
+        if not is_giveaway_id(giveaway_id):
+            raise ValueError(f"Not a giveaway id: {giveaway_id!r}")  # Keeps "../" and the like out of the path
+        return os.path.join(self.path, f"{giveaway_id}.json")
+    
+    def write(self, giveaway_id, giveaway):
+        self._write_file(giveaway_id, giveaway)
+        self._cache.pop(giveaway_id, None)
+    
+    def _write_file(self, giveaway_id, giveaway):
+        os.makedirs(self.path, exist_ok=True)
+        tmp_path = self._file(giveaway_id) + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(giveaway, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._file(giveaway_id))
+    
+    def load(self, giveaway_id):
+        if not is_giveaway_id(giveaway_id):
+            return None
+        giveaway = self._cache.get(giveaway_id)
+        if giveaway is None:
+            try:
+                with open(self._file(giveaway_id), 'r') as f:
+                    giveaway = json.load(f)
+            except (FileNotFoundError, ValueError):
+                return None
+            giveaway["participants"] = ParticipantSet.decode(giveaway["participants"])
+            self._cache[giveaway_id] = giveaway
+            if len(self._cache) > GIVEAWAY_ARCHIVE_CACHE:
+                self._cache.popitem(last=False)
+        self._cache.move_to_end(giveaway_id)
+        return giveaway
+    
+    async def add_winners(self, giveaway_id, user_ids):
+        giveaway = self.load(giveaway_id)
+        # The cached copy is updated first so a reroll running meanwhile can't draw the same winners again
+        giveaway["winner_ids"] = giveaway["winner_ids"] + [user_id for user_id in user_ids if user_id not in giveaway["winner_ids"]]
+        async with self._write_lock:
+            record = dict(giveaway)  # Taken under the lock, so the last write carries every winner so far
+            await asyncio.to_thread(lambda: self._write_file(giveaway_id, {**record, "participants": record["participants"].encode()}))
+
+def is_giveaway_id(value):
+    """Giveaway ids are message snowflakes; anything else can't name one"""
+    value = str(value)
+    # Anything past a signed 64-bit int overflows SQLite and can't be a snowflake anyway
+    return value.isascii() and value.isdigit() and len(value) <= 20 and int(value) < 2**63
+
+def open_giveaway_stores(kind=STORAGE.get("giveaways", "json"), shards=LOCAL_SHARDS):
+    """One giveaway store per shard hosted by this process"""
+    return {shard_id: GIVEAWAY_STORES[kind].for_shard(shard_id) for shard_id in shards}
+
+# Giveaway system
+class GiveawaySystem:
+    """Giveaways of the shards this process hosts, each shard in its own store"""
+    def __init__(self, stores=None):
+        self.stores = stores or open_giveaway_stores()
+        self.default_store = next(iter(self.stores.values()))
+        self.archive = GiveawayArchive()
+        self.deadlines = DeadlineScheduler()
+        for giveaway_id, giveaway in self.active_giveaways():
+            self.deadlines.schedule(giveaway_id, giveaway["end_time"])
+    
+    def store_for(self, message_id):
+        """The store holding a giveaway. Giveaway ids don't carry their guild, so local shards are probed."""
+        if len(self.stores) > 1:
+            for store in self.stores.values():
+                if store.has(str(message_id)):
+                    return store
+        return self.default_store
+    
+    def start(self):
+        for store in self.stores.values():
+            store.start()
+    
+    async def flush(self):
+        """Write out changes still waiting for their group commit"""
+        for store in self.stores.values():
+            await store.flush()
+    
+    async def save_giveaways(self, force=False):
+        """Persist outstanding changes in whatever form the store prefers"""
+        started = time.perf_counter()
+        for store in self.stores.values():
+            await store.compact(force)
+        save_duration.observe(time.perf_counter() - started)
+    
+    def get(self, message_id):
+        if not is_giveaway_id(message_id):
+            return None  # Typed by hand, e.g. "!gend abc"
+        return self.store_for(message_id).get(str(message_id))
+    
+    def lookup(self, message_id):
+        """Like get, but also finds giveaways that have been archived"""
+        return self.get(message_id) or self.archive.load(str(message_id))
+    
+    def active_giveaways(self):
+        if len(self.stores) == 1:
+            return self.default_store.active()
+        return list(heapq.merge(*(store.active() for store in self.stores.values()), key=lambda item: item[1]["end_time"]))
+    
+    def resync_deadlines(self, horizon=60):
+        """Schedule giveaways due within `horizon` seconds that other instances created in the shared store"""
+        before = time.time() + horizon
+        for store in self.stores.values():
+            for giveaway_id, end_time in store.pending_deadlines(before):
+                self.deadlines.schedule(giveaway_id, end_time)
+    
+    async def wait_due_giveaways(self):
+        """Sleep until the next deadline passes, then return the giveaways that are due"""
+        due = []
+        for giveaway_id in await self.deadlines.wait_due():
+            giveaway = self.get(giveaway_id)
+            if giveaway and not giveaway["ended"]:
+                due.append((giveaway_id, giveaway))
+        return due
+    
+    def has_participant(self, message_id, user_id):
+        return self.store_for(message_id).has_participant(str(message_id), user_id)
+    
+    def participant_count(self, message_id):
+        store = self.store_for(message_id)
+        if store.has(str(message_id)):
+            return store.participant_count(str(message_id))
+        archived = self.archive.load(str(message_id))
+        return len(archived["participants"]) if archived else 0
+    
+    def get_participants(self, message_id):
+        store = self.store_for(message_id)
+        if store.has(str(message_id)):
+            return store.participants(str(message_id))
+        archived = self.archive.load(str(message_id))
+        return archived["participants"] if archived else ParticipantSet()
+    
+    async def draw_winners(self, message_id, count):
+        """Pick `count` new winners who have not won this giveaway before and record them"""
+        store = self.store_for(message_id)
+        if store.has(str(message_id)):
+            winners = store.draw(str(message_id), count)
+            if winners:
+                store.add_winners(str(message_id), winners)
+        else:
+            giveaway = self.archive.load(str(message_id))
+            winners = draw_from(giveaway["participants"], giveaway["winner_ids"], count)
+            if winners:
+                await self.archive.add_winners(str(message_id), winners)
+        return winners
     
-    def save_giveaways(self):
-        with open(GIVEAWAY_FILE, 'w') as f:
-            json.dump(self.giveaways, f, indent=4)
+    async def archive_ended(self, retention=GIVEAWAY_ARCHIVE_AFTER):
+        """Move giveaways that ended more than `retention` seconds ago into the archive"""
+        archived = 0
+        for store in self.stores.values():
+            moved = 0
+            for giveaway_id in store.ended_before(time.time() - retention):
+                await asyncio.to_thread(lambda: self.archive.write(giveaway_id, store.export(giveaway_id)))
+                store.delete(giveaway_id)
+                moved += 1
+            if moved:
+                await store.compact(force=True)
+            archived += moved
+        return archived
     
-    def create_giveaway(self, message_id, channel_id, prize, winners, duration, host_id, requirements=None):
-        end_time = datetime.datetime.now() + datetime.timedelta(seconds=duration)
-        self.giveaways[str(message_id)] = {
+    def create_giveaway(self, message_id, channel_id, prize, winners, duration, host_id, requirements=None, embed=None, guild_id=None):
+        end_time = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=duration)
+        store = self.stores[shard_for(guild_id)]
+        store.create(str(message_id), {
             "channel_id": channel_id,
             "prize": prize,
             "winners": winners,
-            "end_time": end_time.isoformat(),
+            "end_time": end_time.timestamp(),
             "host_id": host_id,
-            "participants": [],
             "requirements": requirements or {},
-            "ended": False
-        }
-        self.save_giveaways()
+            "ended": False,
+            "winner_ids": [],
+            "embed": embed
+        })
+        self.deadlines.schedule(str(message_id), end_time.timestamp())
+    
+    def add_participant(self, message_id, user_id, weight=1):
+        return self.store_for(message_id).add_participant(str(message_id), user_id, weight)
     
     def end_giveaway(self, message_id):
-        if str(message_id) in self.giveaways:
-            self.giveaways[str(message_id)]["ended"] = True
-            self.save_giveaways()
+        store = self.store_for(message_id)
+        if store.has(str(message_id)):
+            store.end(str(message_id))
+    
+    def claim_end(self, message_id):
+        """Mark a giveaway ended and return True, unless something else already ended it"""
+        return self.store_for(message_id).claim_end(str(message_id))
     
     def delete_giveaway(self, message_id):
-        if str(message_id) in self.giveaways:
-            del self.giveaways[str(message_id)]
-            self.save_giveaways()
+        store = self.store_for(message_id)
+        if store.has(str(message_id)):
+            store.delete(str(message_id))
 
 giveaway_system = GiveawaySystem()
 
+# Outbound API scheduling
+PRIORITY_WINNERS = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BACKGROUND = 2
+PRIORITY_MARKETING = 3
+
+# (requests, per seconds) for each route, applied separately to every channel
+ROUTE_LIMITS = {
+    "messages.send": (5, 5.0),
+    "messages.edit": (5, 5.0)
+}
+GLOBAL_RATE_LIMIT = (50, 1.0)
+
+class TokenBucket:
+    """Allows `rate` calls per `per` seconds; callers past the limit borrow future tokens"""
+    def __init__(self, rate, per):
+        self.capacity = rate
+        self.tokens = float(rate)
+        self.fill_rate = rate / per
+        self.updated = time.monotonic()
+    
+    def reserve(self):
+        """Take a token and return how long to wait before using it"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0 if self.tokens >= 0 else -self.tokens / self.fill_rate
+    
+    def penalize(self, retry_after):
+        self.tokens = min(self.tokens, -retry_after * self.fill_rate)
+
+class OutboundScheduler:
+    """Paces Discord API calls with per-channel route buckets and a global bucket.
+    
+    Each channel has its own priority queue drained by a short-lived task, so
+    independent channels proceed concurrently while calls to a single channel
+    go out highest priority first and never faster than its bucket allows.
+    """
+    def __init__(self, route_limits=ROUTE_LIMITS, global_limit=GLOBAL_RATE_LIMIT):
+        self.route_limits = route_limits
+        self.global_bucket = TokenBucket(*global_limit)
+        self.buckets = {}
+        self.lanes = {}
+        self.calls = 0
+        self.rate_limited = 0
+        self._sequence = 0
+        self._tasks = set()
+    
+    def submit(self, channel_id, route, action, priority=PRIORITY_NORMAL):
+        """Queue `action()` and return a future for its result"""
+        future = asyncio.get_running_loop().create_future()
+        self._push(channel_id, (priority, route, action, future))
+        return future
+    
+    def send(self, channel, priority=PRIORITY_NORMAL, **kwargs):
+        return self.submit(channel.id, "messages.send", lambda: channel.send(**kwargs), priority)
+    
+    def edit(self, message, priority=PRIORITY_NORMAL, **kwargs):
+        return self.submit(message.channel.id, "messages.edit", lambda: message.edit(**kwargs), priority)
+    
+    def _push(self, channel_id, job):
+        self._sequence += 1
+        priority, route, action, future = job
+        lane = self.lanes.get(channel_id)
+        if lane is None:
+            lane = self.lanes[channel_id] = []
+            self._spawn(self._drain(channel_id, lane))
+        heapq.heappush(lane, (priority, self._sequence, route, action, future))
+    
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    def _bucket(self, route, channel_id):
+        bucket = self.buckets.get((route, channel_id))
+        if bucket is None:
+            bucket = self.buckets[(route, channel_id)] = TokenBucket(*self.route_limits.get(route, (5, 5.0)))
+        return bucket
+    
+    async def _drain(self, channel_id, lane):
+        while lane:
+            priority, _, route, action, future = heapq.heappop(lane)
+            if future.done():
+                continue
+            await asyncio.sleep(self._bucket(route, channel_id).reserve())
+            await asyncio.sleep(self.global_bucket.reserve())
+            self._spawn(self._run(channel_id, (priority, route, action, future)))
+        del self.lanes[channel_id]
+    
+    async def _run(self, channel_id, job):
+        priority, route, action, future = job
+        self.calls += 1
+        started = time.perf_counter()
+        try:
+            result = await action()
+        except discord.HTTPException as e:
+            if e.status == 429 and not future.done():
+                self.rate_limited += 1
+                self._bucket(route, channel_id).penalize(getattr(e, "retry_after", 1.0))
+                self._push(channel_id, job)
+            elif not future.done():
+                future.set_exception(e)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+        else:
+            if not future.done():
+                future.set_result(result)
+        finally:
+            outbound_duration.observe(time.perf_counter() - started, route)
+
+outbound = OutboundScheduler()
+
+class AuditLog:
+    """Structured audit events, appended to a JSONL file and posted to log_channel as digests"""
+    def __init__(self, path):
+        self.path = path
+        self._lines = []
+        self._digest = collections.deque()
+        self._wakeup = asyncio.Event()
+        self._task = None
+    
+    def emit(self, event, **fields):
+        record = {"time": time.time(), "event": event, **fields}
+        self._lines.append(json.dumps(record, default=str, separators=(",", ":")))
+        self._digest.append(record)
+        if len(self._digest) >= AUDIT_DIGEST_SIZE:
+            self._wakeup.set()
+    
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+    
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), AUDIT_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Error writing audit log: {e}")
+    
+    async def flush(self):
+        if self._lines:
+            lines, self._lines = self._lines, []
+            try:
+                await asyncio.to_thread(self._write, lines)
+            except Exception:
+                self._lines[:0] = lines
+                raise
+        
+        if not self._digest:
+            return
+        log_channel = await resolve_channel(CHANNELS.get("log_channel"))
+        while self._digest:
+            embed = self.next_digest()
+            if log_channel:
+                await outbound.send(log_channel, PRIORITY_BACKGROUND, embed=embed)
+    
+    def _write(self, lines):
+        with open(self.path, 'a') as f:
+            f.write("\n".join(lines) + "\n")
+    
+    def next_digest(self):
+        """Take as many queued events as fit in one embed, up to AUDIT_DIGEST_SIZE"""
+        embed = discord.Embed(title="📋 Audit Log", color=0x95a5a6)
+        while self._digest and len(embed.fields) < AUDIT_DIGEST_SIZE:
+            name, value = self.digest_field(self._digest[0])
+            if embed.fields and len(embed) + len(name) + len(value) > EMBED_MAX_CHARS:
+                break
+            self._digest.popleft()
+            embed.add_field(name=name, value=value, inline=False)
+        return embed
+    
+    @staticmethod
+    def digest_field(record):
+        details = [f"**{key}:** {value}" for key, value in record.items() if key not in ("time", "event")]
+        name = record["event"].replace("_", " ").title()[:256]
+        value = (f"<t:{int(record['time'])}:T> " + " • ".join(details))[:1024]
+        return name, value
+
+audit_log = AuditLog(AUDIT_FILE)
+
+# Bonus entries, e.g. "boosters x2" or "<@&123456789> x3" in the requirements text
+BONUS_ENTRY_PATTERN = re.compile(r"(boosters?|<@&(\d+)>|role\s*(\d+))\s*[x×]\s*(\d+)")
+MAX_BONUS_ENTRIES = 100
+
+def parse_bonus_entries(req_text):
+    """Pull bonus-entry rules out of the requirements text, returning (rules, remaining text)"""
+    bonus = {}
+    for match in BONUS_ENTRY_PATTERN.finditer(req_text):
+        entries = max(1, min(int(match.group(4)), MAX_BONUS_ENTRIES))
+        role_id = match.group(2) or match.group(3)
+        if role_id:
+            bonus.setdefault("roles", {})[role_id] = entries
+        else:
+            bonus["booster"] = entries
+    return bonus, BONUS_ENTRY_PATTERN.sub("", req_text)
+
+def entry_weight(requirements, member):
+    """Number of entries a member gets: the best bonus they qualify for, or 1"""
+    bonus = requirements.get("bonus_entries", {})
+    weight = 1
+    if bonus.get("booster") and getattr(member, "premium_since", None):
+        weight = max(weight, bonus["booster"])
+    role_bonus = bonus.get("roles", {})
+    if role_bonus:
+        for role in getattr(member, "roles", []):
+            weight = max(weight, role_bonus.get(str(role.id), 1))
+    return weight
+
+def giveaway_entry_reply(interaction, giveaway_id):
+    """Enter the user into a giveaway and return the message to show them"""
+    giveaway = giveaway_system.get(giveaway_id)
+    if not giveaway or giveaway["ended"]:
+        return "This giveaway has ended!"
+    
+    if giveaway_system.has_participant(giveaway_id, interaction.user.id):
+        return "You've already entered this giveaway!"
+    
+    # Check requirements
+    requirements = giveaway.get("requirements") or {}
+    if requirements.get("boost_server") and not interaction.user.premium_since:
+        return "❌ You need to boost this server to enter!"
+    
+    weight = entry_weight(requirements, interaction.user)
+    giveaway_system.add_participant(giveaway_id, interaction.user.id, weight)
+    entry_counts_dirty.add(giveaway_id)
+    
+    if weight > 1:
+        return f"✅ You've successfully entered the giveaway with **{weight}** entries! Good luck! 🎉"
+    return "✅ You've successfully entered the giveaway! Good luck! 🎉"
+
+async def enter_giveaway(interaction, giveaway_id):
+    await interaction.response.send_message(giveaway_entry_reply(interaction, giveaway_id), ephemeral=True)
+    record_ack(interaction)
+
+class GiveawayEntryButton(discord.ui.DynamicItem[Button], template=r"giveaway:enter:(?P<id>\d+)"):
+    """Entry button shared by every giveaway; the giveaway id travels in the custom_id.
+    
+    Registered once with `bot.add_dynamic_items`, so clicks keep working after a
+    restart and nothing is kept in memory per open giveaway.
+    """
+    def __init__(self, giveaway_id):
+        super().__init__(Button(
+            label="Enter Giveaway 🎉",
+            style=discord.ButtonStyle.success,
+            custom_id=f"giveaway:enter:{giveaway_id}"
+        ))
+        self.giveaway_id = str(giveaway_id)
+    
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(match["id"])
+    
+    async def callback(self, interaction):
+        await enter_giveaway(interaction, self.giveaway_id)
+
 class GiveawayView(View):
-    def __init__(self, giveaway_id, requirements=None):
+    def __init__(self, giveaway_id):
+        super().__init__(timeout=None)
+        self.add_item(GiveawayEntryButton(giveaway_id))
+
+class LegacyGiveawayView(View):
+    """Routes the old shared "enter_giveaway" button by the message it sits on"""
+    def __init__(self):
         super().__init__(timeout=None)
-        self.giveaway_id = giveaway_id
-        self.requirements = requirements or {}
     
     @discord.ui.button(label="Enter Giveaway 🎉", style=discord.ButtonStyle.success, custom_id="enter_giveaway")
-    async def enter_giveaway(self, button, interaction):
-        giveaway = giveaway_system.giveaways.get(self.giveaway_id)
-        if not giveaway:
-            await interaction.response.send_message("This giveaway has ended!", ephemeral=True)
-            return
-        
-        if interaction.user.id in giveaway["participants"]:
-            await interaction.response.send_message("You've already entered this giveaway!", ephemeral=True)
-            return
-        
-        # Check requirements
-        if self.requirements.get("boost_server") and not interaction.user.premium_since:
-            await interaction.response.send_message("❌ You need to boost this server to enter!", ephemeral=True)
-            return
-        
-        giveaway["participants"].append(interaction.user.id)
-        giveaway_system.save_giveaways()
-        
-        await interaction.response.send_message("✅ You've successfully entered the giveaway! Good luck! 🎉", ephemeral=True)
+    async def enter_giveaway(self, interaction, button):
+        await enter_giveaway(interaction, str(interaction.message.id))
 
 class CreateGiveawayModal(Modal):
     def __init__(self):
@@ -178,7 +1806,7 @@ class CreateGiveawayModal(Modal):
         
         self.requirements = TextInput(
             label="Requirements (optional)",
-            placeholder="e.g., Server Boost, Level 5, etc.",
+            placeholder="e.g., Server Boost, boosters x2, <@&role_id> x3",
             required=False,
             max_length=100
         )
@@ -198,7 +1826,9 @@ class CreateGiveawayModal(Modal):
         
         # Parse requirements
         requirements = {}
-        req_text = self.requirements.value.lower()
+        bonus_entries, req_text = parse_bonus_entries(self.requirements.value.lower())
+        if bonus_entries:
+            requirements["bonus_entries"] = bonus_entries
         if "boost" in req_text:
             requirements["boost_server"] = True
         
@@ -208,7 +1838,7 @@ class CreateGiveawayModal(Modal):
             description=f"**Prize:** {self.prize.value}\n"
                        f"**Winners:** {winners}\n"
                        f"**Hosted by:** {interaction.user.mention}\n"
-                       f"**Ends:** <t:{int((datetime.datetime.now() + datetime.timedelta(seconds=duration)).timestamp())}:R>",
+                       f"**Ends:** <t:{int((datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=duration)).timestamp())}:R>",
             color=0xffd700
         )
         
@@ -216,12 +1846,17 @@ class CreateGiveawayModal(Modal):
             req_text = ""
             if requirements.get("boost_server"):
                 req_text += "• Server Boost Required\n"
+            if bonus_entries.get("booster"):
+                req_text += f"• Boosters get {bonus_entries['booster']} entries\n"
+            for role_id, entries in bonus_entries.get("roles", {}).items():
+                req_text += f"• <@&{role_id}> gets {entries} entries\n"
             embed.add_field(name="📋 Requirements", value=req_text, inline=False)
         
         embed.set_footer(text="Click the button below to enter!")
         
-        view = GiveawayView("temp", requirements)
-        message = await interaction.channel.send(embed=embed, view=view)
+        await interaction.response.defer(ephemeral=True)
+        record_ack(interaction)
+        message = await interaction.channel.send(embed=embed)
         
         # Store giveaway
         giveaway_system.create_giveaway(
@@ -231,20 +1866,35 @@ class CreateGiveawayModal(Modal):
             winners,
             duration,
             interaction.user.id,
-            requirements
+            requirements,
+            embed.to_dict(),
+            interaction.guild.id
         )
         
-        # Update view with actual giveaway ID
-        view.giveaway_id = str(message.id)
+        # The entry button needs the message id, so it is added once the message exists
+        try:
+            await with_retries(lambda: outbound.edit(message, embed=embed, view=GiveawayView(message.id)))
+        except Exception as e:
+            # Nobody could enter without the button, so take the giveaway down again
+            print(f"Error adding the entry button to giveaway {message.id}: {e}")
+            giveaway_system.delete_giveaway(message.id)
+            try:
+                await message.delete()
+            except discord.HTTPException:
+                pass
+            await interaction.followup.send("❌ Couldn't add the entry button, so the giveaway was cancelled. Please try again!", ephemeral=True)
+            return
         
-        await interaction.response.send_message("✅ Giveaway created successfully!", ephemeral=True)
+        audit_log.emit("giveaway_created", giveaway=message.id, host=interaction.user.id, prize=self.prize.value,
+                       winners=winners, duration=duration)
+        await interaction.followup.send("✅ Giveaway created successfully!", ephemeral=True)
 
 class GiveawayManagementView(View):
     def __init__(self):
         super().__init__(timeout=None)
     
-    @discord.ui.button(label="Create Giveaway", style=discord.ButtonStyle.primary, emoji="🎉")
-    async def create_giveaway(self, button, interaction):
+    @discord.ui.button(label="Create Giveaway", style=discord.ButtonStyle.primary, emoji="🎉", custom_id="giveaway:create")
+    async def create_giveaway(self, interaction, button):
         if not interaction.user.guild_permissions.manage_messages:
             await interaction.response.send_message("❌ You need manage messages permission to create giveaways!", ephemeral=True)
             return
@@ -252,8 +1902,8 @@ class GiveawayManagementView(View):
         modal = CreateGiveawayModal()
         await interaction.response.send_modal(modal)
     
-    @discord.ui.button(label="Reroll Giveaway", style=discord.ButtonStyle.secondary, emoji="🔁")
-    async def reroll_giveaway(self, button, interaction):
+    @discord.ui.button(label="Reroll Giveaway", style=discord.ButtonStyle.secondary, emoji="🔁", custom_id="giveaway:reroll")
+    async def reroll_giveaway(self, interaction, button):
         if not interaction.user.guild_permissions.manage_messages:
             await interaction.response.send_message("❌ You need manage messages permission to reroll giveaways!", ephemeral=True)
             return
@@ -265,6 +1915,7 @@ class TicketView(View):
         super().__init__(timeout=None)
     
     @discord.ui.select(
+        custom_id="ticket:open",
         placeholder="Select an option...",
         options=[
             discord.SelectOption(label="Buy VPS/Server", emoji="💎", value="buy"),
@@ -274,27 +1925,355 @@ class TicketView(View):
             discord.SelectOption(label="Giveaways", emoji="🎉", value="giveaways")
         ]
     )
-    async def select_callback(self, select, interaction):
+    async def select_callback(self, interaction, select):
         await interaction.response.defer()
-        await create_ticket(interaction, select.values[0])
+        record_ack(interaction)
+        await open_ticket(interaction, select.values[0])
 
-async def create_ticket(interaction, ticket_type):
-    category = bot.get_channel(CHANNELS["ticket_category"])
-    if not category:
-        await interaction.followup.send("❌ Ticket category not found! Please contact admin.", ephemeral=True)
+class TicketRegistry:
+    """Open tickets indexed by (user, type) and by channel, mirrored to one tickets.json per local shard"""
+    def __init__(self, path=TICKETS_FILE, shards=LOCAL_SHARDS):
+        self.paths = {shard_id: shard_path(path, shard_id) for shard_id in shards}
+        self.by_owner = {}
+        self.by_channel = {}
+        self.pending = set()  # (user, type) pairs queued or being created right now
+        self._save_lock = asyncio.Lock()
+        for shard_id in self.paths:
+            for ticket in self.load_tickets(shard_id):
+                self._index(ticket)
+    
+    def load_tickets(self, shard_id):
+        try:
+            with open(self.paths[shard_id], 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+    
+    def _index(self, ticket):
+        self.by_owner[(ticket["user_id"], ticket["type"])] = ticket
+        self.by_channel[ticket["channel_id"]] = ticket
+    
+    def get(self, user_id, ticket_type):
+        return self.by_owner.get((user_id, ticket_type))
+    
+    def get_channel(self, channel_id):
+        return self.by_channel.get(channel_id)
+    
+    def tickets(self):
+        return list(self.by_channel.values())
+    
+    def reserve(self, user_id, ticket_type):
+        """Mark a ticket as being created; False if one already is"""
+        if (user_id, ticket_type) in self.pending:
+            return False
+        self.pending.add((user_id, ticket_type))
+        return True
+    
+    def release(self, user_id, ticket_type):
+        self.pending.discard((user_id, ticket_type))
+    
+    async def add(self, user_id, ticket_type, channel_id, guild_id=None):
+        self._index({"user_id": user_id, "type": ticket_type, "channel_id": channel_id, "guild_id": guild_id, "opened_at": time.time()})
+        await self.save_tickets(shard_for(guild_id))
+    
+    async def remove_channel(self, channel_id):
+        ticket = self.by_channel.pop(channel_id, None)
+        if ticket:
+            self.by_owner.pop((ticket["user_id"], ticket["type"]), None)
+            await self.save_tickets(shard_for(ticket.get("guild_id")))
+        return ticket
+    
+    async def save_tickets(self, shard_id):
+        """Rewrite the ticket file of one shard"""
+        async with self._save_lock:
+            tickets = [ticket for ticket in self.by_channel.values() if shard_for(ticket.get("guild_id")) == shard_id]
+            data = json.dumps(tickets, indent=4)
+            await asyncio.to_thread(self._write, self.paths[shard_id], data)
+    
+    def _write(self, path, data):
+        with open(path, 'w') as f:
+            f.write(data)
+
+class SQLiteTicketRegistry:
+    """Open tickets in the shared database, so every instance sees and dedups the same tickets.
+    
+    A ticket being created is a row without a channel yet. Inserting it is the
+    reservation, which the (user, type) primary key makes exclusive across instances.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS tickets (
+            user_id INTEGER NOT NULL,
+            type TEXT NOT NULL,
+            channel_id INTEGER UNIQUE,
+            guild_id INTEGER,
+            opened_at REAL NOT NULL,
+            PRIMARY KEY (user_id, type)
+        );
+    """
+    
+    def __init__(self, path):
+        self.db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(self.SCHEMA)
+    
+    def get(self, user_id, ticket_type):
+        row = self.db.execute(
+            "SELECT * FROM tickets WHERE user_id = ? AND type = ? AND channel_id IS NOT NULL",
+            (user_id, ticket_type)
+        ).fetchone()
+        return dict(row) if row else None
+    
+    def get_channel(self, channel_id):
+        row = self.db.execute("SELECT * FROM tickets WHERE channel_id = ?", (channel_id,)).fetchone()
+        return dict(row) if row else None
+    
+    def tickets(self):
+        tickets = [dict(row) for row in self.db.execute("SELECT * FROM tickets WHERE channel_id IS NOT NULL")]
+        if SHARD_COUNT:
+            # Every shard shares the table; keep the guilds this process hosts
+            tickets = [ticket for ticket in tickets if ticket["guild_id"] is None or (ticket["guild_id"] >> 22) % SHARD_COUNT in LOCAL_SHARDS]
+        return tickets
+    
+    def reserve(self, user_id, ticket_type):
+        with self.db:
+            self.db.execute(
+                "DELETE FROM tickets WHERE user_id = ? AND type = ? AND channel_id IS NULL AND opened_at < ?",
+                (user_id, ticket_type, time.time() - TICKET_RESERVATION_TIMEOUT)
+            )
+            cursor = self.db.execute(
+                "INSERT OR IGNORE INTO tickets (user_id, type, opened_at) VALUES (?, ?, ?)",
+                (user_id, ticket_type, time.time())
+            )
+        return cursor.rowcount == 1
+    
+    def release(self, user_id, ticket_type):
+        # Only drops a reservation that never got a channel
+        self.db.execute("DELETE FROM tickets WHERE user_id = ? AND type = ? AND channel_id IS NULL", (user_id, ticket_type))
+    
+    async def add(self, user_id, ticket_type, channel_id, guild_id=None):
+        self.db.execute(
+            "INSERT OR REPLACE INTO tickets (user_id, type, channel_id, guild_id, opened_at) VALUES (?, ?, ?, ?, ?)",
+            (user_id, ticket_type, channel_id, guild_id, time.time())
+        )
+    
+    async def remove_channel(self, channel_id):
+        ticket = self.get_channel(channel_id)
+        if ticket:
+            cursor = self.db.execute("DELETE FROM tickets WHERE channel_id = ?", (channel_id,))
+            if cursor.rowcount == 0:
+                return None  # Another instance removed it first
+        return ticket
+
+ticket_registry = SQLiteTicketRegistry(SHARED_STATE_DB) if SHARED_STATE_DB else TicketRegistry()
+
+class TicketPipeline:
+    """Bounded queue of ticket requests served by a fixed pool of workers"""
+    def __init__(self, workers=TICKET_WORKERS, max_queued=TICKET_QUEUE_SIZE):
+        self.workers = workers
+        self.queue = asyncio.Queue(max_queued)
+        self._tasks = []
+    
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+    
+    def submit(self, interaction, ticket_type):
+        try:
+            self.queue.put_nowait((interaction, ticket_type))
+        except asyncio.QueueFull:
+            return False
+        return True
+    
+    async def _work(self):
+        while True:
+            interaction, ticket_type = await self.queue.get()
+            started = time.perf_counter()
+            try:
+                await create_ticket(interaction, ticket_type)
+                ticket_duration.observe(time.perf_counter() - started)
+            except Exception as e:
+                print(f"Error creating {ticket_type} ticket: {e}")
+                try:
+                    await interaction.followup.send("❌ Could not create your ticket, please try again!", ephemeral=True)
+                except discord.HTTPException:
+                    pass
+            finally:
+                ticket_registry.release(interaction.user.id, ticket_type)
+                self.queue.task_done()
+
+ticket_pipeline = TicketPipeline()
+
+async def open_ticket(interaction, ticket_type):
+    """Queue a ticket for creation unless the user already has one of this type"""
+    key = (interaction.user.id, ticket_type)
+    existing = ticket_registry.get(*key)
+    if existing:
+        try:
+            # Archived threads drop out of the cache, so ask the API before treating the ticket as gone
+            if not bot.get_channel(existing["channel_id"]):
+                await bot.fetch_channel(existing["channel_id"])
+        except discord.NotFound:
+            await ticket_registry.remove_channel(existing["channel_id"])  # Deleted while we weren't looking
+        else:
+            await interaction.followup.send(f"❌ You already have an open ticket: <#{existing['channel_id']}>", ephemeral=True)
+            return
+    if not ticket_registry.reserve(*key):
+        await interaction.followup.send("⏳ Your ticket is already being created!", ephemeral=True)
         return
     
-    # Create ticket channel
-    overwrites = {
-        interaction.guild.default_role: discord.PermissionOverwrite(read_messages=False),
-        interaction.user: discord.PermissionOverwrite(read_messages=True, send_messages=True),
+    if not ticket_pipeline.submit(interaction, ticket_type):
+        ticket_registry.release(*key)
+        await interaction.followup.send("❌ We're handling a lot of tickets right now, please try again in a minute!", ephemeral=True)
+        return
+
+def ticket_overwrites(guild, user):
+    return {
+        guild.default_role: discord.PermissionOverwrite(read_messages=False),
+        user: discord.PermissionOverwrite(read_messages=True, send_messages=True),
         bot.user: discord.PermissionOverwrite(read_messages=True, send_messages=True)
     }
+
+class ChannelTicketBackend:
+    """Creates a fresh text channel in the ticket category for every ticket"""
+    not_found_message = "❌ Ticket category not found! Please contact admin."
     
-    ticket_channel = await category.create_text_channel(
-        name=f"{ticket_type}-{interaction.user.name}",
-        overwrites=overwrites
-    )
+    def start(self):
+        pass
+    
+    async def open(self, interaction, ticket_type):
+        category = await resolve_channel(CHANNELS["ticket_category"])
+        if not category:
+            return None
+        return await category.create_text_channel(
+            name=f"{ticket_type}-{interaction.user.name}",
+            overwrites=ticket_overwrites(interaction.guild, interaction.user)
+        )
+    
+    async def close(self, channel, reason):
+        await channel.delete(reason=reason)
+
+class PooledChannelTicketBackend(ChannelTicketBackend):
+    """Keeps hidden, pre-created channels ready so opening a ticket is a single edit.
+    
+    The pool is topped up in the background. Its target size follows an
+    exponentially weighted average of how many tickets are opened per
+    minute, between `size` and `max_size`.
+    """
+    def __init__(self, size, max_size):
+        self.size = size
+        self.max_size = max_size
+        self.pool = collections.deque()
+        self.rate = 0.0  # Tickets opened per minute
+        self._claims = 0
+        self._measured_at = time.monotonic()
+        self._wakeup = asyncio.Event()
+        self._task = None
+    
+    def start(self):
+        if self._task is None:
+            category = bot.get_channel(CHANNELS["ticket_category"])
+            if category:
+                # Adopt pool channels left over from before a restart
+                self.pool.extend(
+                    channel for channel in category.text_channels
+                    if channel.name == TICKET_POOL_NAME and not ticket_registry.get_channel(channel.id)
+                )
+            self._task = asyncio.create_task(self._refill_loop())
+    
+    def target_size(self):
+        return max(self.size, min(self.max_size, math.ceil(self.rate * TICKET_POOL_LEAD_MINUTES)))
+    
+    def _measure_rate(self):
+        now = time.monotonic()
+        elapsed = (now - self._measured_at) / 60
+        if elapsed < 1 / 60:
+            return
+        self.rate = 0.3 * (self._claims / elapsed) + 0.7 * self.rate
+        self._claims = 0
+        self._measured_at = now
+    
+    async def _refill_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), TICKET_POOL_REFILL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            self._measure_rate()
+            category = await resolve_channel(CHANNELS["ticket_category"])
+            while category and len(self.pool) < self.target_size():
+                try:
+                    channel = await category.create_text_channel(
+                        name=TICKET_POOL_NAME,
+                        overwrites={
+                            category.guild.default_role: discord.PermissionOverwrite(read_messages=False),
+                            category.guild.me: discord.PermissionOverwrite(read_messages=True, send_messages=True)
+                        }
+                    )
+                except discord.HTTPException as e:
+                    print(f"Error refilling ticket pool: {e}")
+                    break
+                self.pool.append(channel)
+    
+    async def open(self, interaction, ticket_type):
+        self._claims += 1
+        self._wakeup.set()
+        while self.pool:
+            channel = self.pool.popleft()
+            try:
+                await channel.edit(
+                    name=f"{ticket_type}-{interaction.user.name}",
+                    overwrites=ticket_overwrites(interaction.guild, interaction.user)
+                )
+            except discord.NotFound:
+                continue  # Deleted by hand while it sat in the pool
+            return channel
+        return await super().open(interaction, ticket_type)
+
+class ThreadTicketBackend:
+    """Opens each ticket as a private thread under one support channel.
+    
+    Threads are cheaper to create than channels and don't count toward
+    the 50-per-category or 500-per-guild channel limits.
+    """
+    not_found_message = "❌ Ticket channel not found! Please contact admin."
+    
+    def start(self):
+        pass
+    
+    async def open(self, interaction, ticket_type):
+        channel = await resolve_channel(CHANNELS.get("ticket_channel"))
+        if not channel:
+            return None
+        thread = await channel.create_thread(
+            name=f"{ticket_type}-{interaction.user.name}",
+            type=discord.ChannelType.private_thread,
+            invitable=False,
+            auto_archive_duration=10080  # Longest allowed, so idle tickets are closed by us rather than archived by Discord
+        )
+        await thread.add_user(interaction.user)
+        return thread
+    
+    async def close(self, thread, reason):
+        await thread.edit(archived=True, locked=True, reason=reason)
+
+TICKET_BACKENDS = {
+    "channel": lambda: ChannelTicketBackend(),
+    "thread": lambda: ThreadTicketBackend(),
+    "pool": lambda: PooledChannelTicketBackend(TICKETS.get("pool_size", 5), TICKETS.get("pool_max_size", 20))
+}
+
+ticket_backend = TICKET_BACKENDS[TICKETS.get("mode", "channel")]()
+
+async def create_ticket(interaction, ticket_type):
+    ticket_channel = await ticket_backend.open(interaction, ticket_type)
+    if not ticket_channel:
+        await interaction.followup.send(ticket_backend.not_found_message, ephemeral=True)
+        return
+    await ticket_registry.add(interaction.user.id, ticket_type, ticket_channel.id, interaction.guild.id)
+    touch_ticket(ticket_channel.id)
+    audit_log.emit("ticket_opened", user=interaction.user.id, type=ticket_type, channel=ticket_channel.id)
     
     # Send initial message based on ticket type
     if ticket_type == "buy":
@@ -304,7 +2283,7 @@ async def create_ticket(interaction, ticket_type):
             color=0x00ff00
         )
         view = PurchaseView()
-        await ticket_channel.send(embed=embed, view=view)
+        await outbound.send(ticket_channel, embed=embed, view=view)
         
     elif ticket_type == "free":
         embed = discord.Embed(
@@ -312,7 +2291,7 @@ async def create_ticket(interaction, ticket_type):
             description="Please answer the following questions:\n\n1. What will you use the server for?\n2. How long do you need it?\n3. Any specific requirements?\n4. Why should we choose you?",
             color=0xffd700
         )
-        await ticket_channel.send(embed=embed)
+        await outbound.send(ticket_channel, embed=embed)
         
     elif ticket_type == "partnership":
         embed = discord.Embed(
@@ -326,7 +2305,7 @@ async def create_ticket(interaction, ticket_type):
                        "*Our team will review your application shortly.*",
             color=0x00ff00
         )
-        await ticket_channel.send(embed=embed)
+        await outbound.send(ticket_channel, embed=embed)
         
     elif ticket_type == "support":
         embed = discord.Embed(
@@ -334,7 +2313,7 @@ async def create_ticket(interaction, ticket_type):
             description="Please describe your issue in detail:\n\n1. What service are you using?\n2. What problem are you experiencing?\n3. When did this issue start?\n4. Any error messages?",
             color=0x3498db
         )
-        await ticket_channel.send(embed=embed)
+        await outbound.send(ticket_channel, embed=embed)
     
     elif ticket_type == "giveaways":
         embed = discord.Embed(
@@ -347,15 +2326,211 @@ async def create_ticket(interaction, ticket_type):
                        "Please describe your issue below:",
             color=0xffd700
         )
-        await ticket_channel.send(embed=embed)
+        await outbound.send(ticket_channel, embed=embed)
     
     await interaction.followup.send(f"Ticket created! {ticket_channel.mention}", ephemeral=True)
 
+class TimingWheel:
+    """Hashed timing wheel for many coarse timers driven by one periodic tick.
+    
+    Scheduling or pushing back a timer only updates its deadline, which is
+    O(1). Stale slot entries are moved lazily when their slot comes round,
+    so the cost per tick is the size of one slot, not the number of timers.
+    """
+    def __init__(self, tick=TICKET_WHEEL_TICK, slots=512):
+        self.tick = tick
+        self.slots = [set() for _ in range(slots)]
+        self.deadlines = {}
+        self._placed = set()
+        self._processed = int(time.time() // tick)
+    
+    def __len__(self):
+        return len(self.deadlines)
+    
+    def _place(self, key, deadline):
+        tick = max(int(deadline // self.tick), self._processed + 1)
+        self.slots[tick % len(self.slots)].add(key)
+        self._placed.add(key)
+    
+    def schedule(self, key, deadline):
+        self.deadlines[key] = deadline
+        if key not in self._placed:
+            self._place(key, deadline)
+    
+    def cancel(self, key):
+        self.deadlines.pop(key, None)
+    
+    def advance(self, now):
+        """Return the keys whose deadline has passed since the last call"""
+        expired = []
+        pending = []
+        current = int(now // self.tick)
+        # Catching up more than one revolution would only revisit the same slots
+        for tick in range(max(self._processed + 1, current - len(self.slots) + 1), current + 1):
+            slot = self.slots[tick % len(self.slots)]
+            for key in slot:
+                self._placed.discard(key)
+                deadline = self.deadlines.get(key)
+                if deadline is None:
+                    continue
+                if deadline <= now:
+                    del self.deadlines[key]
+                    expired.append(key)
+                else:
+                    pending.append(key)  # Pushed back, or due in a later revolution
+            slot.clear()
+        self._processed = current
+        for key in pending:
+            self._place(key, self.deadlines[key])
+        return expired
+
+ticket_timers = TimingWheel()
+idle_warned = set()  # Tickets that were warned and will close unless someone speaks
+
+def touch_ticket(channel_id, last_activity=None):
+    """Restart a ticket's inactivity timer"""
+    if not TICKET_IDLE_CLOSE:
+        return
+    idle_warned.discard(channel_id)
+    ticket_timers.schedule(channel_id, (last_activity or time.time()) + (TICKET_IDLE_WARN or TICKET_IDLE_CLOSE))
+
+def schedule_open_tickets():
+    """Start timers for open tickets that have none, such as ones another instance opened"""
+    if not TICKET_IDLE_CLOSE:
+        return
+    for ticket in ticket_registry.tickets():
+        channel_id = ticket["channel_id"]
+        if channel_id in ticket_timers.deadlines:
+            continue
+        channel = bot.get_channel(channel_id)
+        last_activity = ticket["opened_at"]
+        if channel and getattr(channel, "last_message_id", None):
+            last_activity = max(last_activity, discord.utils.snowflake_time(channel.last_message_id).timestamp())
+        touch_ticket(channel_id, last_activity)
+
+transcript_semaphore = asyncio.Semaphore(TRANSCRIPT_EXPORTS)
+
+def transcript_record(message):
+    return {
+        "id": message.id,
+        "author_id": message.author.id,
+        "author": str(message.author),
+        "created_at": message.created_at.isoformat(),
+        "content": message.content,
+        "embeds": [embed.to_dict() for embed in message.embeds],
+        "attachments": [attachment.url for attachment in message.attachments],
+    }
+
+async def export_transcript(channel, ticket):
+    """Stream a ticket's history into a gzipped JSONL file, one page in memory at a time"""
+    os.makedirs(TRANSCRIPT_DIR, exist_ok=True)
+    path = os.path.join(TRANSCRIPT_DIR, f"{ticket['type']}-{ticket['user_id']}-{channel.id}.jsonl.gz")
+    async with transcript_semaphore:
+        count = 0
+        page = []
+        with gzip.open(path, "wt", encoding="utf-8") as transcript:
+            async for message in channel.history(limit=None, oldest_first=True):
+                page.append(json.dumps(transcript_record(message)) + "\n")
+                if len(page) >= TRANSCRIPT_PAGE:
+                    await asyncio.to_thread(transcript.writelines, page)
+                    count += len(page)
+                    page = []
+            await asyncio.to_thread(transcript.writelines, page)
+            count += len(page)
+    
+    log_channel = await resolve_channel(CHANNELS.get("log_channel"))
+    if log_channel:
+        embed = discord.Embed(
+            title="📝 Ticket Transcript",
+            description=f"**Ticket:** {channel.name}\n**Owner:** <@{ticket['user_id']}>\n**Messages:** {count}",
+            color=0x3498db
+        )
+        limit = getattr(log_channel.guild, "filesize_limit", 8 * 1024 * 1024)
+        if os.path.getsize(path) <= limit:
+            await outbound.send(log_channel, PRIORITY_BACKGROUND, embed=embed, file=discord.File(path))
+        else:
+            embed.add_field(name="Stored at", value=path, inline=False)
+            await outbound.send(log_channel, PRIORITY_BACKGROUND, embed=embed)
+    return path
+
+async def close_ticket(channel_id, reason):
+    """Archive the transcript, then close the ticket. Returns False if the export failed."""
+    ticket = ticket_registry.get_channel(channel_id)
+    channel = await resolve_channel(channel_id)
+    ticket_timers.cancel(channel_id)
+    if ticket and channel:
+        try:
+            await export_transcript(channel, ticket)
+        except Exception as e:
+            # Keep the ticket open rather than lose its history; retry on a later tick
+            print(f"Error exporting transcript for ticket {channel_id}: {e}")
+            idle_warned.add(channel_id)
+            ticket_timers.schedule(channel_id, time.time() + 5 * TICKET_WHEEL_TICK)
+            return False
+    
+    idle_warned.discard(channel_id)
+    await ticket_registry.remove_channel(channel_id)
+    audit_log.emit("ticket_closed", channel=channel_id, reason=reason)
+    if channel:
+        await ticket_backend.close(channel, reason)
+    return True
+
+async def handle_idle_ticket(channel_id):
+    if not ticket_registry.get_channel(channel_id):
+        return
+    if not TICKET_IDLE_WARN or channel_id in idle_warned:
+        await close_ticket(channel_id, "Closed after inactivity")
+        return
+    
+    idle_warned.add(channel_id)
+    ticket_timers.schedule(channel_id, time.time() + max(TICKET_IDLE_CLOSE - TICKET_IDLE_WARN, TICKET_WHEEL_TICK))
+    channel = await resolve_channel(channel_id)
+    if channel:
+        embed = discord.Embed(
+            title="⏰ Ticket Inactive",
+            description=f"This ticket has been quiet for a while and will be closed <t:{int(ticket_timers.deadlines[channel_id])}:R> "
+                        "unless someone replies.",
+            color=0xffa500
+        )
+        await outbound.send(channel, PRIORITY_BACKGROUND, embed=embed)
+
+@tasks.loop(seconds=TICKET_WHEEL_TICK)
+async def expire_idle_tickets():
+    """Warn or close tickets whose inactivity timer ran out"""
+    schedule_open_tickets()
+    expired = ticket_timers.advance(time.time())
+    results = await asyncio.gather(*(handle_idle_ticket(channel_id) for channel_id in expired), return_exceptions=True)
+    for channel_id, result in zip(expired, results):
+        if isinstance(result, Exception):
+            print(f"Error closing idle ticket {channel_id}: {result}")
+
+@bot.listen("on_message")
+async def track_ticket_activity(message):
+    if not message.author.bot and ticket_registry.get_channel(message.channel.id):
+        touch_ticket(message.channel.id)
+
+@bot.command()
+async def close(ctx):
+    """Close the ticket this command is used in"""
+    ticket = ticket_registry.get_channel(ctx.channel.id)
+    if not ticket:
+        await ctx.send("❌ This isn't an open ticket!")
+        return
+    
+    if ctx.author.id != ticket["user_id"] and not ctx.author.guild_permissions.manage_channels:
+        await ctx.send("❌ Only the ticket owner or staff can close this ticket!")
+        return
+    
+    await ctx.send("🔒 Saving transcript and closing ticket...")
+    if not await close_ticket(ctx.channel.id, f"Closed by {ctx.author}"):
+        await ctx.send("❌ Couldn't save the transcript, the ticket will stay open for now.")
+
 class PurchaseView(View):
     def __init__(self):
         super().__init__(timeout=None)
     
     @discord.ui.select(
+        custom_id="purchase:plans",
         placeholder="Choose service type...",
         options=[
             discord.SelectOption(label="Minecraft Plans", emoji="🪐", value="minecraft"),
@@ -366,11 +2541,16 @@ class PurchaseView(View):
             discord.SelectOption(label="YouTuber Plans", emoji="📹", value="youtuber")
         ]
     )
-    async def select_callback(self, select, interaction):
+    async def select_callback(self, interaction, select):
         await interaction.response.defer()
+        record_ack(interaction)
         await send_plan_details(interaction, select.values[0])
 
 async def send_plan_details(interaction, plan_type):
+    await interaction.followup.send(await post_plan(plan_type), ephemeral=True)
+
+async def post_plan(plan_type):
+    """Post one plan category to its channel and return the status message to show"""
     channel_map = {
         "minecraft": CHANNELS["minecraft_plans"],
         "vps": CHANNELS["vps_plans"],
@@ -382,151 +2562,32 @@ async def send_plan_details(interaction, plan_type):
     
     channel_id = channel_map.get(plan_type)
     if not channel_id:
-        await interaction.followup.send("❌ Channel not configured!", ephemeral=True)
-        return
+        return "❌ Channel not configured!"
     
-    channel = bot.get_channel(channel_id)
+    channel = await resolve_channel(channel_id)
     if not channel:
-        await interaction.followup.send("❌ Channel not found!", ephemeral=True)
-        return
-    
-    if plan_type == "minecraft":
-        embed = discord.Embed(
-            title="💎・Premium Minecraft Hosting Plans",
-            description="✨ Get **high-performance Minecraft servers** at **super affordable prices** 💠\n💾 SSD / NVMe Storage ｜ ⚙️ Powerful CPU ｜ 💻 Full Panel ｜ 🧠 DDoS Protection\n",
-            color=0x5865F2
-        )
-        
-        for plan_name, details in PLANS["minecraft"].items():
-            embed.add_field(
-                name=f"💎 **{plan_name} Plan** — {details['price']} / Month",
-                value=f"🐏 RAM - **{details['ram']}**\n💾 SSD - **{details['ssd']}**\n⚡ CPU - **{details['cpu']}**",
-                inline=False
-            )
-        
-        embed.add_field(
-            name="⚙️ All Plans Include:",
-            value="> 🌐 Free Subdomain\n> 🧠 DDoS Protection\n> 💻 Full Panel Access\n> 🧾 Permanent Server\n> 🕓 24/7 Uptime\n> 🎯 Fast Setup\n> 🧰 Plugin / Mods Supported\n\n> 💠 **Lapis Nodes** — *Performance • Power • Trust* 🚀",
-            inline=False
-        )
-        
-        await channel.send(embed=embed)
-        await interaction.followup.send("✅ Minecraft plans posted in dedicated channel!", ephemeral=True)
-    
-    elif plan_type == "vps":
-        embed = discord.Embed(
-            title="💻・VPS Hosting Plans",
-            description="🚀 **High-performance Virtual Private Servers** with full root access\n⚡ SSD/NVMe Storage ｜ 🔒 Full Root Access ｜ 🌐 Global Locations ｜ 🔄 Daily Backups\n",
-            color=0x00ff00
-        )
-        
-        for plan_name, details in PLANS["vps"].items():
-            embed.add_field(
-                name=f"💻 **{plan_name}** — {details['price']} / Month",
-                value=f"🐏 RAM - **{details['ram']}**\n💾 Storage - **{details['storage']}**\n⚡ CPU - **{details['cpu']}**\n🌐 Bandwidth - **{details['bandwidth']}**",
-                inline=True
-            )
-        
-        embed.add_field(
-            name="🔧 All VPS Plans Include:",
-            value="> 🔒 Full Root Access\n> 🌐 Multiple OS Choices\n> 🔄 Daily Backups\n> 🛡️ DDoS Protection\n> 💾 SSD/NVMe Storage\n> 🚀 Instant Deployment",
-            inline=False
-        )
-        
-        await channel.send(embed=embed)
-        await interaction.followup.send("✅ VPS plans posted in dedicated channel!", ephemeral=True)
-    
-    elif plan_type == "developer":
-        embed = discord.Embed(
-            title="👨‍💻・Minecraft Developer Plans",
-            description="🛠️ **Specialized hosting for developers** with extra features\n🔧 Database Access ｜ 🌐 Domain Support ｜ 🚀 Development Tools ｜ 📦 Git Integration\n",
-            color=0xFFA500
-        )
-        
-        for plan_name, details in PLANS["developer"].items():
-            embed.add_field(
-                name=f"🔧 **{plan_name}** — {details['price']} / Month",
-                value=f"🐏 RAM - **{details['ram']}**\n💾 Storage - **{details['storage']}**\n✨ Features - **{details['features']}**",
-                inline=True
-            )
-        
-        embed.add_field(
-            name="🚀 Developer Features:",
-            value="> 📦 Git Integration\n> 🗄️ Database Support\n> 🔧 API Access\n> 🚀 CI/CD Pipelines\n> 🌐 Staging Environments\n> 📊 Analytics Dashboard",
-            inline=False
-        )
-        
-        await channel.send(embed=embed)
-        await interaction.followup.send("✅ Developer plans posted in dedicated channel!", ephemeral=True)
+        return "❌ Channel not found!"
     
-    elif plan_type == "domain":
-        embed = discord.Embed(
-            title="🌐・Domain Registration Plans",
-            description="🔗 **Register your perfect domain name** with premium features\n🛡️ Privacy Protection ｜ 📧 Email Forwarding ｜ 🔄 Easy Transfer ｜ 🔒 SSL Certificates\n",
-            color=0x9b59b6
-        )
-        
-        for plan_name, details in PLANS["domain"].items():
-            embed.add_field(
-                name=f"🌐 **{plan_name}** — {details['price']}",
-                value=f"🔄 Transfer - **{details['transfer']}**\n⭐ {details['features']}",
-                inline=True
-            )
-        
-        embed.add_field(
-            name="🔒 Domain Features:",
-            value="> 🛡️ Free Privacy Protection\n> 📧 Email Forwarding\n> 🔄 Easy Domain Transfer\n> 🔒 Free SSL Certificate\n> 🌐 DNS Management\n> 📊 Domain Analytics",
-            inline=False
-        )
-        
-        await channel.send(embed=embed)
-        await interaction.followup.send("✅ Domain plans posted in dedicated channel!", ephemeral=True)
+    layout = PLAN_LAYOUTS[plan_type]
+    embed = plan_embeds.embeds[plan_type]
+    content_hash = plan_embeds.hashes[plan_type]
+    posted = plan_embeds.posts.get(plan_type)
     
-    elif plan_type == "booster":
-        embed = discord.Embed(
-            title="🚀・Server Booster Plans",
-            description="🌟 **Enhance your Discord experience** with booster perks\n🎨 Custom Colors ｜ 🔊 Audio Quality ｜ 🏆 Priority Support ｜ ✨ Exclusive Rewards\n",
-            color=0xe91e63
-        )
-        
-        for plan_name, details in PLANS["booster"].items():
-            embed.add_field(
-                name=f"🌟 **{plan_name}** — {details['price']}",
-                value=f"🎁 {details['benefits']}",
-                inline=True
-            )
-        
-        embed.add_field(
-            name="✨ Booster Benefits:",
-            value="> 🎨 Custom Color Roles\n> 🔊 Enhanced Audio Quality\n> 🏆 Priority Support\n> ✨ Exclusive Emojis\n> 📢 Special Announcements\n> 🎁 Monthly Rewards",
-            inline=False
-        )
-        
-        await channel.send(embed=embed)
-        await interaction.followup.send("✅ Booster plans posted in dedicated channel!", ephemeral=True)
+    if posted and posted["channel_id"] == channel_id:
+        if posted["hash"] == content_hash:
+            return f"✅ {layout['label']} plans are already up to date in dedicated channel!"
+        message = channel.get_partial_message(posted["message_id"])
+        try:
+            await outbound.edit(message, PRIORITY_MARKETING, embed=embed)
+        except discord.NotFound:
+            pass  # Someone deleted the old post, fall through to a fresh one
+        else:
+            await plan_embeds.posts.set(plan_type, {**posted, "hash": content_hash})
+            return f"✅ {layout['label']} plans updated in dedicated channel!"
     
-    elif plan_type == "youtuber":
-        embed = discord.Embed(
-            title="📹・YouTuber & Creator Plans",
-            description="🎬 **Special offers for content creators** and influencers\n📢 Promotion ｜ 🤝 Partnership ｜ 🎁 Free Resources ｜ 💰 Revenue Sharing\n",
-            color=0xff0000
-        )
-        
-        for plan_name, details in PLANS["youtuber"].items():
-            embed.add_field(
-                name=f"📹 **{plan_name}** — {details['price']}",
-                value=f"📊 Subs - **{details['subs']}**\n✨ {details['benefits']}",
-                inline=True
-            )
-        
-        embed.add_field(
-            name="🎬 Creator Benefits:",
-            value="> 📢 Social Media Promotion\n> 🤝 Partnership Opportunities\n> 🎁 Free Resources & Hosting\n> 💰 Revenue Sharing\n> 🚀 Early Access Features\n> 📊 Analytics Support",
-            inline=False
-        )
-        
-        await channel.send(embed=embed)
-        await interaction.followup.send("✅ YouTuber plans posted in dedicated channel!", ephemeral=True)
+    message = await outbound.send(channel, PRIORITY_MARKETING, embed=embed)
+    await plan_embeds.posts.set(plan_type, {"channel_id": channel_id, "message_id": message.id, "hash": content_hash})
+    return f"✅ {layout['label']} plans posted in dedicated channel!"
 
 @bot.command()
 @commands.has_permissions(manage_messages=True)
@@ -546,22 +2607,20 @@ async def giveaway(ctx, action: str = None):
         await ctx.send(embed=embed, view=view)
     
     elif action == "list":
-        active_giveaways = [g for g in giveaway_system.giveaways.values() if not g["ended"]]
+        active_giveaways = giveaway_system.active_giveaways()
         if not active_giveaways:
             await ctx.send("No active giveaways!")
             return
         
         embed = discord.Embed(title="Active Giveaways", color=0xffd700)
-        for msg_id, giveaway in list(giveaway_system.giveaways.items())[:5]:
-            if not giveaway["ended"]:
-                channel = bot.get_channel(giveaway["channel_id"])
-                embed.add_field(
-                    name=giveaway["prize"],
-                    value=f"Winners: {giveaway['winners']} | Participants: {len(giveaway['participants'])}\n"
-                         f"Ends: <t:{int(datetime.datetime.fromisoformat(giveaway['end_time']).timestamp())}:R>\n"
-                         f"[Jump to Giveaway](https://discord.com/channels/{ctx.guild.id}/{giveaway['channel_id']}/{msg_id})",
-                    inline=False
-                )
+        for msg_id, giveaway in active_giveaways[:5]:
+            embed.add_field(
+                name=giveaway["prize"],
+                value=f"Winners: {giveaway['winners']} | Participants: {giveaway_system.participant_count(msg_id)}\n"
+                     f"Ends: <t:{int(giveaway['end_time'])}:R>\n"
+                     f"[Jump to Giveaway](https://discord.com/channels/{ctx.guild.id}/{giveaway['channel_id']}/{msg_id})",
+                inline=False
+            )
         await ctx.send(embed=embed)
     
     else:
@@ -576,11 +2635,73 @@ async def giveaway(ctx, action: str = None):
         )
         await ctx.send(embed=embed)
 
+async def with_retries(action):
+    """Await `action()`, retrying transient Discord/network failures with backoff"""
+    for attempt in range(API_RETRIES):
+        try:
+            return await action()
+        except (discord.NotFound, discord.Forbidden):
+            raise
+        except (discord.HTTPException, aiohttp.ClientError, asyncio.TimeoutError):
+            if attempt == API_RETRIES - 1:
+                raise
+            await asyncio.sleep(2 ** attempt)
+
+async def update_giveaway_message(message_id, giveaway, winner_mentions, no_winners_text):
+    """Mark the giveaway message as ended, rebuilding its embed from stored data"""
+    channel = bot.get_partial_messageable(giveaway["channel_id"])
+    if giveaway.get("embed"):
+        message = channel.get_partial_message(int(message_id))
+        embed = discord.Embed.from_dict(giveaway["embed"])
+    else:
+        # Giveaways created before embeds were stored need one fetch
+        message = await channel.fetch_message(int(message_id))
+        embed = message.embeds[0]
+    embed.color = 0xff0000
+    embed.add_field(
+        name="🎊 Winners",
+        value=", ".join(winner_mentions) if winner_mentions else no_winners_text,
+        inline=False
+    )
+    await outbound.edit(message, PRIORITY_WINNERS, embed=embed, view=None)
+
+giveaway_end_semaphore = asyncio.Semaphore(GIVEAWAY_END_CONCURRENCY)
+
+async def auto_end_giveaway(message_id, giveaway):
+    """Draw, record and announce one expired giveaway; failures stay contained to it"""
+    try:
+        if not giveaway_system.claim_end(message_id):
+            return  # Already ended by !gend or another instance
+        winners = await giveaway_system.draw_winners(message_id, giveaway["winners"])
+    except Exception as e:
+        print(f"Error ending giveaway {message_id}: {e}")
+        audit_log.emit("giveaway_error", giveaway=message_id, error=e)
+        return
+    audit_log.emit("giveaway_ended", giveaway=message_id, winners=winners, ended_by="timer")
+    winner_mentions = [f"<@{winner_id}>" for winner_id in winners]
+    
+    announcement = discord.Embed(
+        title="🎉 Giveaway Ended!",
+        description=f"**Prize:** {giveaway['prize']}\n**Winners:** {', '.join(winner_mentions) if winner_mentions else 'No winners'}",
+        color=0x00ff00
+    )
+    channel = bot.get_partial_messageable(giveaway["channel_id"])
+    
+    async with giveaway_end_semaphore:
+        results = await asyncio.gather(
+            with_retries(lambda: update_giveaway_message(message_id, giveaway, winner_mentions, "No participants")),
+            with_retries(lambda: outbound.send(channel, PRIORITY_WINNERS, embed=announcement)),
+            return_exceptions=True
+        )
+    for result in results:
+        if isinstance(result, Exception):
+            print(f"Error ending giveaway {message_id}: {result}")
+
 @bot.command()
 @commands.has_permissions(manage_messages=True)
 async def gend(ctx, message_id: str):
     """End a giveaway and pick winners"""
-    giveaway = giveaway_system.giveaways.get(message_id)
+    giveaway = giveaway_system.get(message_id)
     if not giveaway:
         await ctx.send("❌ Giveaway not found!")
         return
@@ -589,35 +2710,23 @@ async def gend(ctx, message_id: str):
         await ctx.send("❌ This giveaway has already ended!")
         return
     
-    participants = giveaway["participants"]
-    if not participants:
+    if not giveaway_system.participant_count(message_id):
         await ctx.send("❌ No participants to choose from!")
         return
     
-    winners = []
-    for _ in range(min(giveaway["winners"], len(participants))):
-        winner_id = random.choice(participants)
-        winners.append(winner_id)
-        participants.remove(winner_id)
-    
+    if not giveaway_system.claim_end(message_id):
+        await ctx.send("❌ This giveaway has already ended!")
+        return
+    winners = await giveaway_system.draw_winners(message_id, giveaway["winners"])
     winner_mentions = [f"<@{winner_id}>" for winner_id in winners]
     
     # Update the giveaway message
-    channel = bot.get_channel(giveaway["channel_id"])
     try:
-        message = await channel.fetch_message(int(message_id))
-        embed = message.embeds[0]
-        embed.color = 0xff0000
-        embed.add_field(
-            name="🎊 Winners",
-            value=", ".join(winner_mentions) if winner_mentions else "No winners could be selected",
-            inline=False
-        )
-        await message.edit(embed=embed, view=None)
-    except:
-        pass
+        await with_retries(lambda: update_giveaway_message(message_id, giveaway, winner_mentions, "No winners could be selected"))
+    except Exception as e:
+        print(f"Error updating giveaway message: {e}")
     
-    giveaway_system.end_giveaway(message_id)
+    audit_log.emit("giveaway_ended", giveaway=message_id, winners=winners, ended_by=ctx.author.id)
     
     # Announce winners
     winners_embed = discord.Embed(
@@ -631,17 +2740,24 @@ async def gend(ctx, message_id: str):
 @commands.has_permissions(manage_messages=True)
 async def greroll(ctx, message_id: str):
     """Reroll giveaway winners"""
-    giveaway = giveaway_system.giveaways.get(message_id)
+    giveaway = giveaway_system.lookup(message_id)
     if not giveaway:
         await ctx.send("❌ Giveaway not found!")
         return
     
-    participants = giveaway["participants"]
-    if not participants:
+    if not giveaway["ended"]:
+        await ctx.send("❌ This giveaway is still running! End it with `!gend` first.")
+        return
+    
+    if not giveaway_system.participant_count(message_id):
         await ctx.send("❌ No participants to choose from!")
         return
     
-    winner_id = random.choice(participants)
+    winners = await giveaway_system.draw_winners(message_id, 1)
+    if not winners:
+        await ctx.send("❌ Everyone who entered has already won!")
+        return
+    winner_id = winners[0]
     
     embed = discord.Embed(
         title="🔁 Giveaway Rerolled!",
@@ -650,57 +2766,87 @@ async def greroll(ctx, message_id: str):
     )
     await ctx.send(embed=embed)
 
-@tasks.loop(seconds=30)
+@bot.command()
+@commands.has_permissions(manage_messages=True)
+async def ginfo(ctx, message_id: str):
+    """Show a giveaway, including ones that have been archived"""
+    giveaway = giveaway_system.lookup(message_id)
+    if not giveaway:
+        await ctx.send("❌ Giveaway not found!")
+        return
+    
+    if not giveaway["ended"]:
+        status = f"Ends <t:{int(giveaway['end_time'])}:R>"
+    elif giveaway_system.get(message_id):
+        status = "Ended"
+    else:
+        status = "Ended (archived)"
+    winner_mentions = [f"<@{winner_id}>" for winner_id in giveaway["winner_ids"]]
+    
+    embed = discord.Embed(title=f"🎉 {giveaway['prize']}", color=0xffd700)
+    embed.add_field(name="Status", value=status, inline=True)
+    embed.add_field(name="Host", value=f"<@{giveaway['host_id']}>", inline=True)
+    embed.add_field(name="Entrants", value=str(giveaway_system.participant_count(message_id)), inline=True)
+    embed.add_field(name="Winners", value=", ".join(winner_mentions) if winner_mentions else "None yet", inline=False)
+    await ctx.send(embed=embed)
+
+@tasks.loop()
 async def check_giveaways():
-    """Check for ended giveaways"""
-    current_time = datetime.datetime.now()
-    for message_id, giveaway in giveaway_system.giveaways.items():
-        if giveaway["ended"]:
-            continue
-        
-        end_time = datetime.datetime.fromisoformat(giveaway["end_time"])
-        if current_time >= end_time:
-            # Auto-end the giveaway
-            channel = bot.get_channel(giveaway["channel_id"])
-            if channel:
-                participants = giveaway["participants"]
-                winners = []
-                
-                for _ in range(min(giveaway["winners"], len(participants))):
-                    winner_id = random.choice(participants)
-                    winners.append(winner_id)
-                    participants.remove(winner_id)
-                
-                winner_mentions = [f"<@{winner_id}>" for winner_id in winners]
-                
-                try:
-                    message = await channel.fetch_message(int(message_id))
-                    embed = message.embeds[0]
-                    embed.color = 0xff0000
-                    embed.add_field(
-                        name="🎊 Winners",
-                        value=", ".join(winner_mentions) if winner_mentions else "No participants",
-                        inline=False
-                    )
-                    await message.edit(embed=embed, view=None)
-                    
-                    # Send announcement
-                    announcement = discord.Embed(
-                        title="🎉 Giveaway Ended!",
-                        description=f"**Prize:** {giveaway['prize']}\n**Winners:** {', '.join(winner_mentions) if winner_mentions else 'No winners'}",
-                        color=0x00ff00
-                    )
-                    await channel.send(embed=announcement)
-                    
-                except Exception as e:
-                    print(f"Error ending giveaway: {e}")
-                
-                giveaway_system.end_giveaway(message_id)
+    """End giveaways as their deadlines pass"""
+    due = await giveaway_system.wait_due_giveaways()
+    if not scheduler_lease.is_leader:
+        return  # Lost the lease while waiting; the new leader picks these up from the store
+    await asyncio.gather(*(auto_end_giveaway(message_id, giveaway) for message_id, giveaway in due))
+
+# Giveaways whose entrant count changed since the last embed refresh
+entry_counts_dirty = set()
+
+async def update_entry_count(message_id):
+    giveaway = giveaway_system.get(message_id)
+    if not giveaway or giveaway["ended"] or not giveaway.get("embed"):
+        return
+    message = bot.get_partial_messageable(giveaway["channel_id"]).get_partial_message(int(message_id))
+    
+    async def edit_count():
+        # Checked when the edit goes out, not when it was queued: the winners edit
+        # outranks queued count edits, and one landing after it would revive the live embed
+        current = giveaway_system.get(message_id)
+        if not current or current["ended"]:
+            return None
+        embed = discord.Embed.from_dict(current["embed"])
+        embed.add_field(name="👥 Entries", value=str(giveaway_system.participant_count(message_id)), inline=False)
+        return await message.edit(embed=embed)
+    
+    try:
+        await outbound.submit(message.channel.id, "messages.edit", edit_count, PRIORITY_BACKGROUND)
+    except discord.HTTPException as e:
+        print(f"Error updating entry count for giveaway {message_id}: {e}")
+
+@tasks.loop(seconds=ENTRY_COUNT_INTERVAL)
+async def refresh_entry_counts():
+    """Edit each giveaway that gained entrants at most once per interval"""
+    if not entry_counts_dirty:
+        return
+    dirty = list(entry_counts_dirty)
+    entry_counts_dirty.clear()
+    await asyncio.gather(*(update_entry_count(message_id) for message_id in dirty))
+
+@tasks.loop(minutes=5)
+async def compact_giveaways():
+    """Compact giveaway storage and archive old giveaways in the background"""
+    await giveaway_system.save_giveaways()
+    try:
+        archived = await giveaway_system.archive_ended()
+    except Exception as e:
+        print(f"Error archiving giveaways: {e}")
+    else:
+        if archived:
+            print(f"🗄️ Archived {archived} ended giveaway(s)")
 
 @bot.command()
 async def post_partnership(ctx):
     """Post the partnership guidelines"""
-    channel = bot.get_channel(CHANNELS["partnership"])
+    channel = await resolve_channel(CHANNELS["partnership"])
     if not channel:
         await ctx.send("❌ Partnership channel not found!")
         return
@@ -763,22 +2909,266 @@ async def post_all_plans(ctx):
     """Post all plans to their respective channels"""
     plans = ["minecraft", "vps", "developer", "domain", "booster", "youtuber"]
     
-    for plan_type in plans:
-        try:
-            await send_plan_details(ctx, plan_type)
-            await asyncio.sleep(1)  # Avoid rate limits
-        except Exception as e:
-            await ctx.send(f"❌ Error posting {plan_type} plans: {str(e)}")
+    # Each plan lives in its own channel, so the outbound scheduler posts them in parallel
+    results = await asyncio.gather(*(post_plan(plan_type) for plan_type in plans), return_exceptions=True)
+    for plan_type, result in zip(plans, results):
+        if isinstance(result, Exception):
+            await ctx.send(f"❌ Error posting {plan_type} plans: {str(result)}")
+        elif result.startswith("❌"):
+            await ctx.send(f"❌ Error posting {plan_type} plans: {result[2:]}")
     
     await ctx.send("✅ All plans have been posted to their respective channels!")
 
+def describe_plan(details):
+    return " ｜ ".join(f"{key.capitalize()}: {value}" for key, value in details.items())
+
+plan_group = app_commands.Group(name="plan", description="Browse Lapis Nodes plans")
+
+@plan_group.command(name="find", description="Search plans by name or spec, e.g. 16GB or $10")
+@app_commands.describe(query="Plan name, category or spec to search for")
+async def plan_find(interaction: discord.Interaction, query: str):
+    if ":" in query and plan_catalog.get(*query.split(":", 1)):
+        matches = [plan_catalog.get(*query.split(":", 1))]  # Picked from autocomplete
+    else:
+        matches = plan_catalog.find(query, limit=10)
+    
+    if not matches:
+        await interaction.response.send_message(f"❌ No plans match `{query}`!", ephemeral=True)
+        return
+    
+    embed = discord.Embed(title=f"🔎 Plans matching {query}", color=0x5865F2)
+    for category, plan_name, details in matches:
+        embed.add_field(
+            name=f"{plan_name} ({PLAN_LAYOUTS.get(category, {}).get('label', category)})",
+            value=describe_plan(details),
+            inline=False
+        )
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+    record_ack(interaction)
+
+@plan_find.autocomplete("query")
+async def plan_find_autocomplete(interaction: discord.Interaction, current: str):
+    return [
+        app_commands.Choice(name=f"{plan_name} — {describe_plan(details)}"[:100], value=f"{category}:{plan_name}"[:100])
+        for category, plan_name, details in plan_catalog.find(current, limit=25)
+    ]
+
+bot.tree.add_command(plan_group)
+
+@bot.command()
+async def reload_plans(ctx):
+    """Reload plans.json and rebuild the plan index and embeds"""
+    if not ctx.author.guild_permissions.administrator:
+        await ctx.send("❌ You need administrator permissions to use this command!")
+        return
+    
+    try:
+        plans = await asyncio.to_thread(load_plans, True)
+        plan_embeds.rebuild(plans)  # Validates every plan before anything is swapped in
+    except FileNotFoundError:
+        await ctx.send(f"❌ {PLANS_FILE} not found, keeping the current plans!")
+        return
+    except ValueError as e:
+        await ctx.send(f"❌ {PLANS_FILE} was not loaded: {e}")
+        return
+    
+    PLANS.clear()
+    PLANS.update(plans)
+    plan_catalog.rebuild(PLANS)
+    await ctx.send(f"✅ Reloaded {len(plan_catalog.entries)} plans from {PLANS_FILE}!")
+
+async def guild_of_channel(channel_id, guilds):
+    """Guild id of a channel, or None if it no longer exists; `guilds` caches answers"""
+    if channel_id not in guilds:
+        try:
+            channel = bot.get_channel(channel_id) or await bot.fetch_channel(channel_id)
+            guilds[channel_id] = channel.guild.id
+        except (discord.NotFound, discord.Forbidden):
+            guilds[channel_id] = None
+    return guilds[channel_id]
+
+async def import_unsharded_state():
+    """Split giveaways and tickets from the unsharded files into this process's shards, once per shard.
+    
+    Each entry goes to the shard of its channel's guild. Other processes take
+    their own shards from the same files, so the files are left in place.
+    """
+    shards = [shard_id for shard_id in LOCAL_SHARDS if not os.path.exists(shard_path(LEGACY_IMPORT_MARKER, shard_id))]
+    if not shards:
+        return
+    kind = STORAGE.get("giveaways", "json")
+    guilds = {}
+    imported_giveaways = 0
+    imported_tickets = 0
+    
+    legacy_files = [GIVEAWAY_FILE, GIVEAWAY_JOURNAL_FILE] if kind == "json" else [GIVEAWAY_DB_FILE]
+    if any(os.path.exists(path) for path in legacy_files):
+        legacy = GIVEAWAY_STORES[kind]()  # The default paths are the unsharded files
+        giveaway_ids = [giveaway_id for giveaway_id, _ in legacy.active()] + legacy.ended_before(math.inf)
+        for giveaway_id in giveaway_ids:
+            giveaway = legacy.get(giveaway_id)
+            guild_id = await guild_of_channel(giveaway["channel_id"], guilds)
+            if guild_id is None:
+                print(f"⚠️ Not moving giveaway {giveaway_id} into a shard, its channel is gone")
+                continue
+            shard_id = (guild_id >> 22) % SHARD_COUNT
+            store = giveaway_system.stores[shard_id] if shard_id in shards else None
+            if store is None or store.has(giveaway_id):
+                continue  # Another process's shard, one moved earlier, or already moved
+            store.create(giveaway_id, {key: value for key, value in giveaway.items() if key not in ("participants", "winner_ids")})
+            participants = legacy.participants(giveaway_id)
+            for position, user_id in enumerate(participants):
+                store.add_participant(giveaway_id, user_id, participants.weight(position))
+            if giveaway["winner_ids"]:
+                store.add_winners(giveaway_id, giveaway["winner_ids"])
+            if not giveaway["ended"]:
+                giveaway_system.deadlines.schedule(giveaway_id, giveaway["end_time"])
+            imported_giveaways += 1
+        for shard_id in shards:
+            await giveaway_system.stores[shard_id].compact(force=True)
+    
+    if os.path.exists(TICKETS_FILE):
+        with open(TICKETS_FILE, 'r') as f:
+            legacy_tickets = json.load(f)
+        for ticket in legacy_tickets:
+            guild_id = ticket.get("guild_id") or await guild_of_channel(ticket["channel_id"], guilds)
+            if guild_id is None or (guild_id >> 22) % SHARD_COUNT not in shards:
+                continue
+            if not ticket_registry.get_channel(ticket["channel_id"]):
+                await ticket_registry.add(ticket["user_id"], ticket["type"], ticket["channel_id"], guild_id)
+                imported_tickets += 1
+    
+    for shard_id in shards:
+        open(shard_path(LEGACY_IMPORT_MARKER, shard_id), 'w').close()
+    if imported_giveaways or imported_tickets:
+        print(f"📦 Moved {imported_giveaways} giveaways and {imported_tickets} tickets from the unsharded files into shards {shards}")
+
+@bot.event
+async def setup_hook():
+    memory_baseline["rss"] = current_rss()
+    if SHARD_COUNT:
+        await import_unsharded_state()
+    loop_watchdog.start()
+    await start_http_server()
+    # Persistent components, so buttons and menus on old messages survive restarts
+    bot.add_dynamic_items(GiveawayEntryButton)
+    bot.add_view(LegacyGiveawayView())
+    bot.add_view(GiveawayManagementView())
+    bot.add_view(TicketView())
+    bot.add_view(PurchaseView())
+    await bot.tree.sync()
+
+bot_close = bot.close
+
+async def close_bot():
+    """Flush giveaway changes still in the commit window before the event loop goes away"""
+    try:
+        await giveaway_system.flush()
+    except Exception as e:
+        print(f"Error flushing giveaway journal on shutdown: {e}")
+    await bot_close()
+
+bot.close = close_bot
+
+# Coordination between instances
+LEASE_SECONDS = COORDINATION.get("lease_seconds", 10)
+LEASE_RENEW_INTERVAL = LEASE_SECONDS / 3
+
+class LeaderLease:
+    """Expiring lease in a shared SQLite file, so only one instance runs the timer-driven work.
+    
+    The holder renews it every few seconds. If it dies or stalls, the lease
+    expires and the next standby to try takes it over.
+    """
+    def __init__(self, path, name, ttl=LEASE_SECONDS, enabled=True):
+        self.path = path
+        self.name = name
+        self.ttl = ttl
+        self.enabled = enabled
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{random.getrandbits(32):08x}"
+        self._valid_until = 0.0  # Monotonic time our hold runs out, with a renewal's worth of margin
+        self._db = None
+    
+    @property
+    def is_leader(self):
+        return not self.enabled or time.monotonic() < self._valid_until
+    
+    async def renew(self):
+        """Take or extend the lease if it is free, expired or already ours"""
+        started = time.monotonic()
+        try:
+            held = await asyncio.to_thread(self._renew)
+        except sqlite3.Error as e:
+            print(f"Error renewing scheduler lease: {e}")
+            return self.is_leader
+        self._valid_until = started + self.ttl - LEASE_RENEW_INTERVAL if held else 0.0
+        return held
+    
+    def _renew(self):
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, timeout=LEASE_RENEW_INTERVAL, isolation_level=None, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, holder TEXT NOT NULL, expires_at REAL NOT NULL)")
+        now = time.time()
+        self._db.execute(
+            "INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at "
+            "WHERE leases.holder = excluded.holder OR leases.expires_at < ?",
+            (self.name, self.holder, now + self.ttl, now)
+        )
+        row = self._db.execute("SELECT holder FROM leases WHERE name = ?", (self.name,)).fetchone()
+        return row is not None and row[0] == self.holder
+
+scheduler_lease = LeaderLease(
+    COORDINATION.get("lease_path", "coordination.db"),
+    "scheduler" + (f":{','.join(map(str, LOCAL_SHARDS))}" if SHARD_COUNT else ""),
+    enabled=COORDINATION.get("enabled", False)
+)
+
+def start_scheduled_work():
+    if not check_giveaways.is_running():
+        check_giveaways.start()
+    if not compact_giveaways.is_running():
+        compact_giveaways.start()
+    if not expire_idle_tickets.is_running():
+        expire_idle_tickets.start()
+
+def stop_scheduled_work():
+    for loop in (check_giveaways, compact_giveaways, expire_idle_tickets):
+        if loop.is_running():
+            loop.stop()  # Let the current iteration finish
+
+@tasks.loop(seconds=LEASE_RENEW_INTERVAL)
+async def coordinate():
+    """Run the timer-driven loops only while this instance holds the scheduler lease"""
+    was_leader = scheduler_lease.is_leader
+    if await scheduler_lease.renew():
+        if not was_leader:
+            print(f"👑 Took the scheduler lease as {scheduler_lease.holder}")
+        giveaway_system.resync_deadlines()
+        start_scheduled_work()
+    else:
+        if was_leader:
+            print("⏸️ Lost the scheduler lease, standing by")
+        stop_scheduled_work()
+
 @bot.event
 async def on_ready():
     print(f'✅ {bot.user} has logged in successfully!')
     print(f'🎯 Bot is in {len(bot.guilds)} guild(s)')
     print(f'💎 Lapis Nodes Bot is ready!')
     await bot.change_presence(activity=discord.Activity(type=discord.ActivityType.watching, name="Lapis Nodes & Giveaways"))
-    check_giveaways.start()
+    giveaway_system.start()
+    if scheduler_lease.enabled:
+        if not coordinate.is_running():
+            coordinate.start()
+    else:
+        start_scheduled_work()
+    if not refresh_entry_counts.is_running():
+        refresh_entry_counts.start()
+    ticket_pipeline.start()
+    ticket_backend.start()
+    audit_log.start()
 
 @bot.command()
 async def setup(ctx):
@@ -835,6 +3225,12 @@ async def help_commands(ctx):
         "!giveaway_panel": "Setup giveaway management panel",
         "!gend <message_id>": "End a giveaway and pick winners",
         "!greroll <message_id>": "Reroll giveaway winners",
+        "!ginfo <message_id>": "Show a giveaway, including archived ones",
+        "!reload_plans": "Reload plans.json without restarting",
+        "!close": "Close the ticket you're in",
+        "!memstats": "Show memory use per cached guild and member",
+        "!profile <seconds>": "Profile the bot for a while and save the results",
+        "/plan find <query>": "Search plans by name or spec",
         "!help_commands": "Show this help message"
     }
     
@@ -851,6 +3247,7 @@ async def update_config(ctx, key: str, value: int):
         return
     
     if key in CHANNELS:
+        audit_log.emit("config_updated", user=ctx.author.id, key=key, old=CHANNELS[key], new=value)
         CHANNELS[key] = value
         config["channel_ids"][key] = value
         with open('config.json', 'w') as f:
@@ -859,6 +3256,80 @@ async def update_config(ctx, key: str, value: int):
     else:
         await ctx.send("❌ Invalid channel key!")
 
+@bot.event
+async def on_guild_channel_delete(channel):
+    await ticket_registry.remove_channel(channel.id)
+
+@bot.event
+async def on_raw_thread_delete(payload):
+    await ticket_registry.remove_channel(payload.thread_id)
+
+@bot.event
+async def on_raw_message_delete(payload):
+    await plan_embeds.posts.discard_messages({payload.message_id})
+
+@bot.event
+async def on_raw_bulk_message_delete(payload):
+    await plan_embeds.posts.discard_messages(payload.message_ids)
+
+@bot.command()
+async def memstats(ctx):
+    """Show resident memory against what the gateway caches hold"""
+    if not ctx.author.guild_permissions.administrator:
+        await ctx.send("❌ You need administrator permissions to use this command!")
+        return
+    
+    rss = current_rss()
+    cache_bytes = max(rss - memory_baseline.get("rss", rss), 0)
+    guild_count = len(bot.guilds)
+    member_count = sum(len(guild.members) for guild in bot.guilds)
+    message_count = len(bot.cached_messages)
+    
+    embed = discord.Embed(title="🧠 Memory Usage", color=0x3498db)
+    embed.add_field(name="Profile", value="lean" if LEAN else "full", inline=True)
+    embed.add_field(name="Intents", value=", ".join(name for name, enabled in bot.intents if enabled) or "none", inline=False)
+    embed.add_field(name="RSS", value=f"{rss / 2**20:.1f} MiB", inline=True)
+    embed.add_field(name="Since connect", value=f"{cache_bytes / 2**20:.1f} MiB", inline=True)
+    embed.add_field(name="Cached", value=f"{guild_count} guilds • {member_count} members • {message_count} messages", inline=False)
+    if guild_count:
+        embed.add_field(name="Per guild", value=f"{cache_bytes / guild_count / 1024:.1f} KiB", inline=True)
+    if member_count:
+        embed.add_field(name="Per member", value=f"{cache_bytes / member_count:.0f} B", inline=True)
+    await ctx.send(embed=embed)
+
+@bot.command()
+async def profile(ctx, seconds: int = 30):
+    """Profile the event loop for a number of seconds and save a pstats file"""
+    if not ctx.author.guild_permissions.administrator:
+        await ctx.send("❌ You need administrator permissions to use this command!")
+        return
+    
+    if profile_lock.locked():
+        await ctx.send("❌ A profile is already running!")
+        return
+    
+    seconds = max(1, min(seconds, PROFILE_MAX_SECONDS))
+    async with profile_lock:
+        await ctx.send(f"⏱️ Profiling for {seconds}s...")
+        profiler = cProfile.Profile()
+        profiler.enable()  # Coroutines all run on this thread, so this sees every handler
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.disable()
+    
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"profile-{int(time.time())}.pstats")
+    await asyncio.to_thread(profiler.dump_stats, path)
+    
+    stats = pstats.Stats(profiler)
+    top = []
+    for (filename, line, function), (_, calls, _, cumulative, _) in stats.stats.items():
+        top.append((cumulative, calls, f"{os.path.basename(filename)}:{line}({function})"))
+    top.sort(reverse=True)
+    summary = "\n".join(f"{cumulative:8.3f}s {calls:>8} {name}" for cumulative, calls, name in top[:15])
+    await ctx.send(f"✅ Saved `{path}`\n```\n{summary[:1800]}\n```")
+
 # Error handling
 @bot.event
 async def on_command_error(ctx, error):
@@ -870,26 +3341,68 @@ async def on_command_error(ctx, error):
         pass  # Ignore unknown commands
     else:
         print(f"Error: {error}")
+        audit_log.emit("command_error", command=ctx.command, user=ctx.author.id, error=error)
         await ctx.send(f"❌ An error occurred: {str(error)}")
 
-# Keep alive for Replit
-from flask import Flask
-from threading import Thread
+# Health and metrics server, served from the bot's own event loop
+def finite(value):
+    return value if math.isfinite(value) else None  # Latency is inf until the first heartbeat
 
-app = Flask('')
+async def home(request):
+    return web.Response(text="🤖 Lapis Nodes Bot is running!")
 
-@app.route('/')
-def home():
-    return "🤖 Lapis Nodes Bot is running!"
+async def healthz(request):
+    healthy = bot.is_ready() and not bot.is_closed() and (check_giveaways.is_running() or not scheduler_lease.is_leader)
+    return web.json_response({
+        "status": "ok" if healthy else "degraded",
+        "latency": finite(bot.latency),
+        "shards": [
+            {"id": shard.id, "latency": finite(shard.latency), "closed": shard.is_closed()}
+            for shard in bot.shards.values()
+        ] if SHARD_COUNT else [{"id": 0, "latency": finite(bot.latency), "closed": bot.is_closed()}],
+        "check_giveaways": check_giveaways.is_running(),
+        "leader": scheduler_lease.is_leader,
+        "guilds": len(bot.guilds)
+    }, status=200 if healthy else 503)
 
-def run():
-    app.run(host='0.0.0.0', port=8080)
+async def metrics(request):
+    lines = []
+    for histogram in (ack_latency, save_duration, ticket_duration, outbound_duration, loop_lag):
+        lines.extend(histogram.render())
+    lines += [
+        "# HELP event_loop_stalls_total Times the event loop was blocked past the watchdog threshold",
+        "# TYPE event_loop_stalls_total counter",
+        f"event_loop_stalls_total {loop_watchdog.stalls}",
+        "# HELP scheduler_leader Whether this instance runs the timer-driven work",
+        "# TYPE scheduler_leader gauge",
+        f"scheduler_leader {int(scheduler_lease.is_leader)}",
+        "# HELP outbound_calls_total Discord API calls made through the outbound scheduler",
+        "# TYPE outbound_calls_total counter",
+        f"outbound_calls_total {outbound.calls}",
+        "# HELP outbound_rate_limited_total Outbound calls that failed with a 429 and were requeued",
+        "# TYPE outbound_rate_limited_total counter",
+        f"outbound_rate_limited_total {outbound.rate_limited}",
+        "# HELP discord_http_rate_limited_total 429s retried inside discord.py",
+        "# TYPE discord_http_rate_limited_total counter",
+        f"discord_http_rate_limited_total {http_rate_limits.count}",
+        "# HELP discord_gateway_latency_seconds Heartbeat latency",
+        "# TYPE discord_gateway_latency_seconds gauge",
+        f"discord_gateway_latency_seconds {bot.latency if math.isfinite(bot.latency) else 'NaN'}",
+        "# HELP process_resident_memory_bytes Resident memory",
+        "# TYPE process_resident_memory_bytes gauge",
+        f"process_resident_memory_bytes {current_rss()}",
+    ]
+    return web.Response(text="\n".join(lines) + "\n", content_type="text/plain", charset="utf-8")
 
-def keep_alive():
-    server = Thread(target=run)
-    server.start()
+async def start_http_server():
+    app = web.Application()
+    app.router.add_get("/", home)
+    app.router.add_get("/healthz", healthz)
+    app.router.add_get("/metrics", metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "0.0.0.0", RUNTIME.get("http_port", 8080)).start()
 
 # Start the bot
 if __name__ == "__main__":
-    keep_alive()
     bot.run(os.getenv('DISCORD_TOKEN'))
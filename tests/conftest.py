@@ -0,0 +1,16 @@
+import importlib
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+@pytest.fixture
+def main(tmp_path, monkeypatch):
+    # main writes its default config and data files to the working directory
+    shutil.copy(os.path.join(ROOT, "plans.json"), tmp_path)
+    monkeypatch.chdir(tmp_path)
+    return importlib.import_module("main")
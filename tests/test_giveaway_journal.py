@@ -0,0 +1,28 @@
+import asyncio
+
+def open_store(main):
+    return main.JsonGiveawayStore("giveaways.json", "giveaways.journal")
+
+def test_entries_after_torn_write_survive_restart(main):
+    async def scenario():
+        store = open_store(main)
+        store.create("1", {"channel_id": 2, "prize": "Prize", "winners": 1, "end_time": 0, "ended": False, "host_id": 3})
+        store.add_participant("1", 10)
+        await store.journal.flush()
+        with open("giveaways.journal", "a") as f:
+            f.write('{"op":"enter","id":"1","us')  # Crash halfway through a write
+        
+        store = open_store(main)
+        store.add_participant("1", 11)
+        store.add_participant("1", 12)
+        await store.journal.flush()
+        return open_store(main)
+    
+    store = asyncio.run(scenario())
+    assert store.participant_count("1") == 3
+    assert store.journal.records == 4
+
+def test_replay_without_journal(main):
+    store = open_store(main)
+    assert store.giveaways == {}
+    assert store.journal.records == 0
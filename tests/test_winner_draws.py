@@ -0,0 +1,89 @@
+import random
+
+def prefix_sums(weights):
+    sums = [0]
+    for weight in weights:
+        sums.append(sums[-1] + weight)
+    return sums
+
+def brute_force_find(weights, target):
+    for position, end in enumerate(prefix_sums(weights)[1:]):
+        if target < end:
+            return position
+
+def tree_state(tree):
+    return [tree._prefix(i) for i in range(len(tree) + 1)], tree.total
+
+def weighted_participants(main, count):
+    rng = random.Random(1)
+    participants = main.ParticipantSet()
+    for user_id in range(1, count + 1):
+        participants.add(user_id, rng.randint(1, 5))
+    participants.add(count + 1, 2)  # Guarantees the set is weighted whatever the rng drew
+    return participants
+
+def test_fenwick_tree_matches_brute_force(main):
+    rng = random.Random(0)
+    weights = [rng.randint(0, 9) for _ in range(50)]
+    tree = main.FenwickTree(weights[:20])
+    for weight in weights[20:]:
+        tree.append(weight)
+    for _ in range(30):
+        position = rng.randrange(len(weights))
+        delta = rng.randint(-weights[position], 9)
+        weights[position] += delta
+        tree.add(position, delta)
+    
+    assert len(tree) == len(weights)
+    assert tree.total == sum(weights)
+    assert [tree._prefix(i) for i in range(len(weights) + 1)] == prefix_sums(weights)
+    for target in range(tree.total):
+        assert tree.find(target) == brute_force_find(weights, target)
+
+def test_reroll_never_repeats_a_winner(main):
+    participants = main.ParticipantSet(range(1, 21))
+    winners = main.WinnerDraw(participants).draw(5)
+    for _ in range(15):
+        rerolled = main.WinnerDraw(participants, winners).draw(1)
+        assert rerolled[0] not in winners
+        winners += rerolled
+    
+    assert sorted(winners) == list(range(1, 21))
+    assert main.WinnerDraw(participants, winners).draw(1) == []
+
+def test_weighted_draw_leaves_tree_unchanged(main):
+    participants = weighted_participants(main, 30)
+    before = tree_state(participants.tree)
+    draw = main.WeightedWinnerDraw(participants, [3, 7])
+    
+    winners = draw.draw(10)
+    winners += draw.draw(10)
+    
+    assert tree_state(participants.tree) == before
+    assert len(winners) == len(set(winners)) == 20
+    assert not {3, 7} & set(winners)
+
+def test_weighted_draw_stops_when_everyone_has_won(main):
+    participants = weighted_participants(main, 5)
+    winners = main.draw_from(participants, [1], 10)
+    
+    assert sorted(winners) == [2, 3, 4, 5, 6]
+
+def test_sqlite_draw_skips_past_winners(main):
+    store = main.SQLiteGiveawayStore("giveaways.db")
+    store.create("1", {"channel_id": 2, "prize": "Prize", "winners": 1, "end_time": 0, "ended": False, "host_id": 3, "requirements": {}})
+    for user_id in range(1, 41):
+        store.add_participant("1", user_id, 1 + user_id % 3)
+    
+    winners = store.draw("1", 5)
+    store.add_winners("1", winners)
+    while True:
+        rerolled = store.draw("1", 3)
+        if not rerolled:
+            break
+        assert not set(rerolled) & set(winners)
+        winners += rerolled
+        store.add_winners("1", rerolled)
+    
+    assert sorted(winners) == list(range(1, 41))
+    assert sorted(store.get("1")["winner_ids"]) == list(range(1, 41))